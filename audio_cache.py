@@ -0,0 +1,205 @@
+"""
+TTS 音檔快取
+
+以 (text, lang, slow) 的內容雜湊當檔名存在磁碟上，同一個字同一種速度
+只需要合成一次。多個 Streamlit session、多個 server process 可以共用
+同一個資料夾：寫入一律先寫暫存檔再 os.replace (原子操作)，讀到一半
+被別的 process 淘汰掉就當作沒命中。
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+AUDIO_CACHE_DIR = '.audio_cache'
+AUDIO_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+# 超過上限時一次清到上限的 90%，避免每寫一檔就掃一次資料夾
+EVICT_LOW_WATER = 0.9
+# 預載工作排進佇列後超過這個秒數還沒開始，就視為過期直接放棄
+PREFETCH_DEADLINE = 20.0
+PREFETCH_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+
+def audio_key(text, lang='en', slow=False):
+    """(text, lang, slow) -> 固定長度的內容雜湊"""
+    raw = f"{lang}\x1f{int(bool(slow))}\x1f{text}".encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+def gtts_synthesize(text, lang='en', slow=False):
+    """預設的合成後端：呼叫 gTTS，回傳 MP3 bytes (gTTS 第一次合成時才載入)"""
+    try:
+        from gtts import gTTS
+    except ImportError:
+        raise RuntimeError("尚未安裝 gTTS。請執行 pip install gTTS") from None
+    fp = BytesIO()
+    gTTS(text=text, lang=lang, slow=slow).write_to_fp(fp)
+    return fp.getvalue()
+
+
+class AudioCache:
+    def __init__(self, cache_dir=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES, synthesize=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.synthesize = synthesize or gtts_synthesize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # 目前資料夾大小的估計值；別的 process 也會寫入，所以真正要淘汰前會重新掃描
+        self._approx_bytes = self._scan_total()
+
+    def _path(self, key):
+        # 兩層目錄，避免單一資料夾檔案數爆量
+        return os.path.join(self.cache_dir, key[:2], key + '.mp3')
+
+    def _scan(self):
+        entries = []
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.mp3'): continue
+                path = os.path.join(root, name)
+                try:
+                    st_ = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st_.st_mtime, st_.st_size, path))
+        return entries
+
+    def _scan_total(self):
+        return sum(size for _mtime, size, _path in self._scan())
+
+    def contains(self, text, lang='en', slow=False):
+        """磁碟上有沒有這段音檔 (不讀檔、不計入命中率)"""
+        return os.path.exists(self._path(audio_key(text, lang, slow)))
+
+    def get(self, text, lang='en', slow=False, count=True):
+        """
+        命中就回傳 bytes，否則回傳 None。
+        count=False 不計入命中率 (背景預載用：同一次請求在前景已經算過了)
+        """
+        path = self._path(audio_key(text, lang, slow))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 更新 mtime 當作 LRU 的「最近使用時間」(atime 常被 noatime 關掉)
+            os.utime(path, None)
+        except FileNotFoundError:
+            data = None
+        if count:
+            with self._lock:
+                if data is None: self.misses += 1
+                else: self.hits += 1
+        return data
+
+    def put(self, text, data, lang='en', slow=False):
+        path = self._path(audio_key(text, lang, slow))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        with self._lock:
+            self._approx_bytes += len(data)
+            over = self._approx_bytes > self.max_bytes
+        if over: self.evict()
+
+    def get_or_synthesize(self, text, lang='en', slow=False, count=True):
+        data = self.get(text, lang, slow, count=count)
+        if data is None:
+            data = self.synthesize(text, lang=lang, slow=slow)
+            self.put(text, data, lang, slow)
+        return data
+
+    def evict(self):
+        """依最近使用時間淘汰最舊的檔案，直到低於上限的 90%"""
+        entries = sorted(self._scan())
+        total = sum(size for _mtime, size, _path in entries)
+        target = int(self.max_bytes * EVICT_LOW_WATER)
+        for _mtime, size, path in entries:
+            if total <= target: break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # 別的 process 已經刪掉了
+            total -= size
+        with self._lock: self._approx_bytes = total
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "approx_bytes": self._approx_bytes,
+            }
+
+
+class AudioPrefetcher:
+    """
+    背景預先合成音檔：學習者停在第 i 張卡時，先把後面幾張卡要用的音檔
+    合成進 AudioCache。前景只用 get_ready() 查詢，沒準備好就回傳 None，
+    不會讓換卡卡在 TTS 上。
+    """
+    def __init__(self, cache, max_workers=PREFETCH_WORKERS):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tts-prefetch')
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _run(self, text, lang, slow, deadline):
+        if time.monotonic() > deadline:
+            return None  # 排太久了，學習者大概早就翻過這張卡
+        try:
+            return self.cache.get_or_synthesize(text, lang, slow, count=False)
+        except Exception:
+            logger.warning("預載音檔失敗: %r (slow=%s)", text, slow, exc_info=True)
+            raise
+
+    def _done(self, key, _future):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def submit(self, text, lang='en', slow=False, deadline=PREFETCH_DEADLINE):
+        """排入一個預載工作；同一個 key 已在排隊中就共用同一個 future"""
+        if not text: return None
+        key = audio_key(text, lang, slow)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None: return future
+            future = self._pool.submit(self._run, text, lang, slow, time.monotonic() + deadline)
+            self._inflight[key] = future
+        # 要在鎖外註冊：已完成的 future 會在這裡直接呼叫 callback，而 callback 也要拿鎖
+        future.add_done_callback(lambda f, key=key: self._done(key, f))
+        return future
+
+    def prefetch(self, texts, lang='en', slow=False, deadline=PREFETCH_DEADLINE):
+        for text in texts:
+            if not self.cache.contains(text, lang, slow):
+                self.submit(text, lang, slow, deadline)
+
+    def get_ready(self, text, lang='en', slow=False, wait=0.0):
+        """
+        回傳已經準備好的音檔 bytes；最多等 wait 秒，仍未完成就回傳 None。
+        還沒排進佇列的字會順便排進去，下一次 rerun 就有機會拿到。
+        """
+        data = self.cache.get(text, lang, slow)
+        if data is not None: return data
+        future = self.submit(text, lang, slow)
+        if wait <= 0 and not future.done(): return None
+        try:
+            return future.result(timeout=wait)
+        except Exception:
+            # 逾時或合成失敗都不擋畫面；失敗原因已在背景執行緒記錄
+            return None
@@ -0,0 +1,104 @@
+"""
+音檔包 (audio pack)
+
+convert.py 在建資料庫時一次把所有單字的一般/慢速發音合成好，寫成單一檔案：
+
+    [8 bytes magic][8 bytes 索引位置][8 bytes 索引長度][音檔 ... ][JSON 索引]
+
+索引是 {audio_key: [offset, length]}，key 跟 AudioCache 用同一個雜湊，
+所以 pet_app.py 可以先查音檔包、查不到再走 TTS。執行時用 mmap 開檔，
+取音檔只是切一段 memoryview，不複製也不需要網路。
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_cache import audio_key, gtts_synthesize
+
+AUDIO_PACK_FILE = 'pet_audio.pack'
+PACK_MAGIC = b'PETAUD1\n'
+_HEADER = struct.Struct('<8sQQ')
+
+
+def stub_synthesize(text, lang='en', slow=False):
+    """
+    離線用的替身後端：產生一段靜音 MP3 (MPEG-1 Layer III, 128kbps, 44.1kHz)。
+    長度跟字數成正比、慢速加倍，方便在沒有網路的環境建包與測試。
+    """
+    frame = b'\xff\xfb\x90\x64' + b'\x00' * 413
+    n_frames = max(1, len(text) // 2) * (2 if slow else 1)
+    return frame * n_frames
+
+
+def build_audio_pack(texts, filename=AUDIO_PACK_FILE, lang='en', synthesize=None, workers=8):
+    """
+    texts 中每個字都合成一般與慢速兩種版本，平行合成後依序寫入音檔包。
+    回傳寫入的音檔數。
+    """
+    synthesize = synthesize or gtts_synthesize
+    jobs = []
+    seen = set()
+    for text in texts:
+        if not text: continue
+        for slow in (False, True):
+            key = audio_key(text, lang, slow)
+            if key in seen: continue
+            seen.add(key)
+            jobs.append((key, text, slow))
+
+    index = {}
+    out_dir = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(PACK_MAGIC, 0, 0))
+            offset = _HEADER.size
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # map 保持原順序，結果一邊回來一邊寫，不必整包放在記憶體
+                clips = pool.map(lambda job: synthesize(job[1], lang=lang, slow=job[2]), jobs)
+                for (key, _text, _slow), data in zip(jobs, clips):
+                    f.write(data)
+                    index[key] = [offset, len(data)]
+                    offset += len(data)
+            index_bytes = json.dumps(index, separators=(',', ':')).encode('utf-8')
+            f.write(index_bytes)
+            f.seek(0)
+            f.write(_HEADER.pack(PACK_MAGIC, offset, len(index_bytes)))
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    return len(index)
+
+
+class AudioPack:
+    """唯讀的音檔包，用 mmap 開啟，get() 回傳 memoryview (零複製)"""
+    def __init__(self, filename=AUDIO_PACK_FILE):
+        self._file = open(filename, 'rb')
+        try:
+            # 空檔案 mmap 會丟 ValueError；比表頭還短 (寫到一半的檔案) 也一律當成 ValueError
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._mm) < _HEADER.size:
+                raise ValueError(f"音檔包不完整: {filename}")
+            magic, index_offset, index_len = _HEADER.unpack_from(self._mm, 0)
+            if magic != PACK_MAGIC:
+                raise ValueError(f"不是音檔包: {filename}")
+            if index_offset + index_len > len(self._mm):
+                raise ValueError(f"音檔包不完整: {filename}")
+            self._index = json.loads(self._mm[index_offset:index_offset + index_len])
+        except BaseException:
+            self._file.close()
+            raise
+        self._view = memoryview(self._mm)
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, text, lang='en', slow=False):
+        loc = self._index.get(audio_key(text, lang, slow))
+        if loc is None: return None
+        offset, length = loc
+        return self._view[offset:offset + length]
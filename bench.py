@@ -0,0 +1,406 @@
+"""
+效能基準測試 (benchmark)
+
+用合成題庫量測各條熱路徑，結果寫成 JSON，方便比較不同版本：
+    python bench.py                                  # 預設 1k / 10k 字
+    python bench.py --sizes 1000 10000 100000 --json bench_results.json
+    python bench.py --skip-rerun                     # 沒裝 streamlit 時略過整頁 rerun
+    python bench.py --imports                        # 只看冷啟動的匯入時間報告
+
+合成題庫有兩種表格排版 (兩個解析器都要能讀)：
+    header  每天一個表格，第一列是表頭：排序 | 單字 | 音標 | 中文意思 | 例句
+    mixed   沒有表頭，欄位順序不同：「1. word (n)」| 中文意思 | 音標 | 例句
+另外產生舊版 pet_database.csv 格式的 CSV 題庫。
+"""
+import argparse
+import atexit
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from xml.sax.saxutils import escape
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = (1000, 10000)
+LAYOUTS = ('header', 'mixed')
+DAYS = 28
+# pet_app.py 啟動時匯入的本地模組；HEAVY_MODULES 不該在啟動時就被載入
+APP_MODULES = ('audio_cache', 'audio_pack', 'vocab_store', 'deck', 'progress_store',
+               'srs', 'fragments', 'search_index', 'tracing')
+HEAVY_MODULES = ('pandas', 'numpy', 'gtts', 'pyphen', 'docx')
+
+_CONSONANTS = "bcdfghjklmnprstvwz"
+_VOWELS = "aeiou"
+_HANZI = "能力在國外接受意外大約關於學校朋友家庭快樂時間工作天氣水果顏色動物旅行音樂運動書本電話"
+_POS = ("(n)", "(v)", "(adj)", "(adv)", "(prep)", "(n & v)")
+_HEADER = ["排序", "單字", "音標", "中文意思", "例句"]
+
+
+# ==========================================
+# 合成題庫
+# ==========================================
+def make_words(n, seed=0):
+    """n 個不重複的假單字，平均分到 28 天"""
+    rng = random.Random(seed)
+    words, seen = [], set()
+    per_day = max(1, -(-n // DAYS))
+    while len(words) < n:
+        word = ''.join(rng.choice(_CONSONANTS) + rng.choice(_VOWELS) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.3: word += rng.choice(_CONSONANTS)
+        if word in seen: word += str(len(words))
+        seen.add(word)
+        words.append({
+            "day": len(words) // per_day + 1,
+            "word": word,
+            "pos": rng.choice(_POS),
+            "ipa": word.replace('c', 'k'),
+            "meaning": ''.join(rng.choice(_HANZI) for _ in range(rng.randint(2, 8))),
+            "example": f"We talk about the {word} every day.",
+        })
+    return words
+
+
+def _cell(text):
+    return f'<w:tc><w:p><w:r><w:t xml:space="preserve">{escape(str(text))}</w:t></w:r></w:p></w:tc>'
+
+
+def _table_row(cells):
+    return '<w:tr>' + ''.join(map(_cell, cells)) + '</w:tr>'
+
+
+def _layout_row(layout, idx, w):
+    if layout == 'header':
+        return [idx, f"{w['word']} {w['pos']}", f"/{w['ipa']}/", w['meaning'], w['example']]
+    return [f"{idx}. {w['word']} {w['pos']}", w['meaning'], f"/{w['ipa']}/", w['example']]
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>')
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="word/document.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>')
+
+
+def write_docx(path, words, layout='header'):
+    """寫一份最小的 .docx：每天一個段落標題 + 一個表格 (不需要 python-docx)"""
+    parts = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>']
+    by_day = {}
+    for w in words: by_day.setdefault(w['day'], []).append(w)
+    for day, day_words in sorted(by_day.items()):
+        parts.append(f'<w:p><w:r><w:t>Day {day}</w:t></w:r></w:p><w:tbl>')
+        if layout == 'header': parts.append(_table_row(_HEADER))
+        parts.extend(_table_row(_layout_row(layout, i, w)) for i, w in enumerate(day_words, start=1))
+        parts.append('</w:tbl>')
+    parts.append('</w:body></w:document>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _RELS)
+        zf.writestr('word/document.xml', ''.join(parts))
+    return path
+
+
+def write_csv(path, words):
+    """舊版 pet_database.csv 格式"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=["day", "word", "pos", "ipa", "meaning", "example"])
+        writer.writeheader()
+        writer.writerows(words)
+    return path
+
+
+# ==========================================
+# 計時
+# ==========================================
+def measure(fn, repeat=3, setup=None):
+    """執行 repeat 次 (每次前呼叫 setup，不計時)，回傳秒數統計"""
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"repeat": repeat, "best": min(times), "median": statistics.median(times), "mean": statistics.fmean(times)}
+
+
+class Bench:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, name, fn, size=None, layout=None, setup=None, repeat=None, **extra):
+        stats = measure(fn, repeat or self.repeat, setup)
+        self.results.append({"name": name, "size": size, "layout": layout, **stats, **extra})
+        tag = f"{name} [{size}{'/' + layout if layout else ''}]"
+        print(f"  {tag:<42} best {stats['best'] * 1000:9.2f} ms   median {stats['median'] * 1000:9.2f} ms", flush=True)
+
+    def skip(self, name, reason, size=None):
+        self.results.append({"name": name, "size": size, "skipped": reason})
+        print(f"  {name} [{size}] 略過: {reason}", flush=True)
+
+
+def quiet():
+    # convert.py 會 print 進度，計時時丟掉
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+# ==========================================
+# 各條熱路徑
+# ==========================================
+def bench_parsers(bench, size, words, workdir):
+    from convert import PetVocabProcessor
+    from docx_stream import iter_table_rows
+    from vocab_parser import parse_rows
+    processor = PetVocabProcessor()
+    for layout in LAYOUTS:
+        path = write_docx(os.path.join(workdir, f"deck_{size}_{layout}.docx"), words, layout)
+        # 跟 pet_app.read_word_file 上傳時走同一條路
+        bench.run("parse_rows", lambda: list(parse_rows(iter_table_rows(path))), size, layout)
+
+        def convert_parse():
+            with quiet(): processor.parse_docx(path)
+        bench.run("convert.parse_docx", convert_parse, size, layout)
+
+
+def bench_convert(bench, size, words, workdir):
+    from convert import PetVocabProcessor
+    from syllables import split_syllables
+    processor = PetVocabProcessor()
+    texts = [w['word'] for w in words]
+
+    def syllables():
+        for word in texts: processor.get_syllables(word)
+    bench.run("get_syllables (cold)", syllables, size, setup=split_syllables.cache_clear)
+    bench.run("get_syllables (warm)", syllables, size)
+
+    data = [processor.to_entry(i, w) for i, w in enumerate(words, start=1)]
+    out = os.path.join(workdir, "pet_vocab_db.json")
+
+    def export():
+        with quiet(): processor.export_to_json(data, out)
+    bench.run("export_to_json", export, size)
+
+
+def bench_deck(bench, size, words, workdir):
+    from deck import Deck
+    from vocab_store import VocabStore
+    csv_path = write_csv(os.path.join(workdir, f"deck_{size}.csv"), words)
+    db_path = os.path.join(workdir, f"deck_{size}.db")
+    store = VocabStore(db_path)
+    bench.run("VocabStore.import_csv", lambda: store.import_csv(csv_path), size)
+    # 常駐記憶體：建好之後還留著的配置 (讀資料庫的暫存列已釋放)
+    tracemalloc.start()
+    deck = Deck(store)
+    deck_kb = round(tracemalloc.get_traced_memory()[0] / 1024, 1)
+    tracemalloc.stop()
+    bench.run("Deck build", lambda: Deck(store), size, deck_kb=deck_kb)
+
+    def study_all():
+        # 每張卡 rerun 時做的事：取當天第 i 個字、讀出各欄位
+        for day in deck.days:
+            words = deck.day_words(day)
+            for i in range(len(words)):
+                w = words[i]
+                w.word, w.meaning, w.pos, w.ipa, w.example
+    bench.run("card access (every word)", study_all, size)
+
+    day_words = deck.day_words(1)
+    rng = random.Random(0)
+    bench.run("Deck.build_quiz (1 day)", lambda: deck.build_quiz(day_words, rng), size,
+              questions=len(day_words))
+    bench_search(bench, size, deck)
+
+
+def bench_search(bench, size, deck):
+    from search_index import SearchIndex
+    bench.run("SearchIndex build", lambda: SearchIndex(deck.words), size)
+    index = SearchIndex(deck.words)
+    # 模擬邊打邊查：50 個英文字、50 個中文意思、50 段例句裡的片語，每多打一個字查一次
+    rng = random.Random(1)
+    sample = [deck.words[rng.randrange(len(deck))] for _ in range(50)]
+    phrases = ["every day", "about the"]
+    for w in sample:
+        tokens = w.example.split()
+        start = rng.randrange(max(1, len(tokens) - 1))
+        phrases.append(' '.join(tokens[start:start + 2]))
+    queries = [w.word[:i] for w in sample for i in range(1, len(w.word) + 1)]
+    queries += [w.meaning[:i] for w in sample for i in range(1, min(len(w.meaning), 4) + 1)]
+    # 片語從打完第一個字、開始打第二個字算起
+    queries += [p[:i] for p in phrases for i in range(p.find(' ') + 2, len(p) + 1)]
+
+    def type_all():
+        for q in queries: index.search(q)
+    bench.run("search (per keystroke x all)", type_all, size, keystrokes=len(queries))
+    worst = max(measure(lambda q=q: index.search(q), 1)["best"] for q in queries)
+    print(f"  {'search worst keystroke':<42} {worst * 1000:9.3f} ms", flush=True)
+
+
+def bench_fragments(bench, size, words):
+    import fragments
+    from syllables import split_syllables
+    chunks = [split_syllables(w['word']) for w in words]
+    texts = [w['word'] for w in words]
+
+    def colored():
+        for c in chunks: fragments.get_colored_word_html(c)
+    bench.run("get_colored_word_html (cold)", colored, size, setup=fragments.get_colored_word_html.cache_clear)
+    bench.run("get_colored_word_html (warm)", colored, size)
+
+    def spelling():
+        # 模擬 Stage 3：每個字從空白一路拼到完成
+        for word in texts:
+            for i in range(len(word) + 1): fragments.get_spelling_slots_html(word, word[:i])
+
+    def clear_spelling():
+        fragments._spelling_slots.cache_clear()
+        fragments._filled_slots.cache_clear()
+    bench.run("get_spelling_slots_html (cold)", spelling, size, setup=clear_spelling)
+    bench.run("get_spelling_slots_html (warm)", spelling, size)
+
+
+def bench_rerun(bench, size, words, workdir, reruns):
+    """整頁 rerun：用 AppTest 在暫存資料夾跑 pet_app.py (發音換成本機替身)"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        bench.skip("script rerun", "沒有安裝 streamlit", size)
+        return
+    import audio_cache
+    app_dir = os.path.join(workdir, f"app_{size}")
+    os.makedirs(app_dir)
+    for name in os.listdir(HERE):
+        if name.endswith('.py'): shutil.copy(os.path.join(HERE, name), app_dir)
+    write_csv(os.path.join(app_dir, 'pet_database.csv'), words)
+
+    original_synth, original_cwd = audio_cache.gtts_synthesize, os.getcwd()
+    audio_cache.gtts_synthesize = lambda text, lang='en', slow=False: b'\xff\xfb' + text.encode()
+    os.chdir(app_dir)
+    try:
+        at = AppTest.from_file(os.path.join(app_dir, 'pet_app.py'), default_timeout=600)
+        bench.run("script rerun (first, imports deck)", at.run, size, repeat=1)
+        bench.run("script rerun (stage 1 card)", at.run, size, repeat=reruns)
+        next_btn = [b for b in at.button if b.label == "下一步 ➡"]
+        if next_btn:
+            next_btn[0].click().run()
+            bench.run("script rerun (stage 2 puzzle)", at.run, size, repeat=reruns)
+    finally:
+        os.chdir(original_cwd)
+        audio_cache.gtts_synthesize = original_synth
+
+
+# ==========================================
+# 冷啟動：匯入時間
+# ==========================================
+def import_report(modules=APP_MODULES, top=10):
+    """
+    開一個新的 Python process，用 -X importtime 量 App 模組的匯入時間
+    (streamlit 本身先匯入、不計入)。時間單位毫秒：
+        {"total_ms", "modules": {模組: 累計}, "slowest": [[模組, 自身], ...], "heavy": [已載入的重模組]}
+    """
+    code = (f"import sys, streamlit; import {', '.join(modules)}; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=HERE, capture_output=True, text=True, check=True)
+    entries, after_streamlit = [], False
+    for line in proc.stderr.splitlines():
+        # "import time:      self |  cumulative | <縮排>模組"
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        self_us, cum_us, name = line[len('import time:'):].split('|')
+        top_level = not name[1:].startswith(' ')
+        name = name.strip()
+        if after_streamlit:
+            entries.append((name, int(self_us) / 1000, int(cum_us) / 1000, top_level))
+        elif top_level and name == 'streamlit':
+            after_streamlit = True
+    heavy = proc.stdout.strip()
+    return {
+        "total_ms": round(sum(cum for _n, _s, cum, top_level in entries if top_level), 3),
+        "modules": {n: round(cum, 3) for n, _s, cum, top_level in entries if n in modules},
+        "slowest": [[n, round(s, 3)] for n, s, _c, _t in sorted(entries, key=lambda e: -e[1])[:top]],
+        "heavy": heavy.split(',') if heavy else [],
+    }
+
+
+def bench_imports(bench):
+    report = import_report()
+    bench.results.append({"name": "cold imports", **report})
+    print(f"  {'cold imports (app modules)':<42} total {report['total_ms']:9.2f} ms", flush=True)
+    for name, ms in report["slowest"]:
+        print(f"    {name:<40} {ms:9.2f} ms")
+    if report["heavy"]:
+        print(f"  ⚠️ 啟動時就載入了: {', '.join(report['heavy'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PET 單字 App 效能基準測試")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--reruns', type=int, default=10, help="整頁 rerun 量幾次")
+    parser.add_argument('--json', default='bench_results.json', help="結果輸出的 JSON 檔 ('-' 表示 stdout)")
+    parser.add_argument('--skip-rerun', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--imports', action='store_true', help="只量冷啟動的匯入時間")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    try:
+        import pyphen  # noqa: F401
+        has_pyphen = True
+    except ImportError:
+        has_pyphen = False
+
+    bench = Bench(args.repeat)
+    workdir = tempfile.mkdtemp(prefix='pet_bench_')
+    # App 的進度背景寫入執行緒在 process 結束時 (atexit) 才寫完；
+    # atexit 後註冊的先執行，所以暫存資料夾要在這裡先註冊、最後才刪
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    print("🚀 冷啟動", flush=True)
+    bench_imports(bench)
+    for size in ([] if args.imports else args.sizes):
+        print(f"📦 {size} 字", flush=True)
+        words = make_words(size, args.seed)
+        bench_parsers(bench, size, words, workdir)
+        bench_convert(bench, size, words, workdir)
+        bench_deck(bench, size, words, workdir)
+        bench_fragments(bench, size, words)
+        if not args.skip_rerun:
+            bench_rerun(bench, size, words, workdir, args.reruns)
+
+    report = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pyphen": has_pyphen,
+        "seed": args.seed,
+        "results": bench.results,
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    else:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 結果已寫入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
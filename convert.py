@@ -1,159 +1,93 @@
-import re
+import argparse
+import glob
+import hashlib
 import json
 import os
 import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.etree.ElementTree import ParseError
 
-# 嘗試匯入必要的庫，如果沒有安裝會提示
-try:
-    from docx import Document
-except ImportError:
-    Document = None
+from docx_stream import iter_table_rows
+from syllables import hyphenator, split_syllables
+from vocab_parser import clean_word_text, parse_rows
 
-try:
-    import pyphen
-except ImportError:
-    pyphen = None
+from audio_pack import AUDIO_PACK_FILE, build_audio_pack, stub_synthesize
+
+DEFAULT_DOCX = "更新版PET28天.docx"
+BATCH_OUT_DIR = "converted"
+BATCH_MANIFEST = ".convert_manifest.json"
+# 輸出格式或解析規則改變時加一，下次批次會全部重建
+BATCH_FORMAT = 1
 
 class PetVocabProcessor:
     def __init__(self):
-        # 初始化音節拆解工具
-        if pyphen:
-            self.dic = pyphen.Pyphen(lang='en')
-        else:
-            self.dic = None
-            print("警告: 未安裝 pyphen，將無法自動拆解音節。請執行 pip install pyphen")
+        # 音節拆解工具第一次拆字時才載入 (只匯出 JSON 或用範例資料時用不到)
+        self._warned = False
+
+    @property
+    def dic(self):
+        return hyphenator()
 
     def get_syllables(self, word: str) -> list:
         """
         將單字拆解為音節列表
         例如: 'ability' -> ['a', 'bil', 'i', 'ty']
         """
-        if not self.dic or not word:
+        if not word:
+            return [word]
+        if not self.dic:
+            if not self._warned:
+                self._warned = True
+                print("警告: 未安裝 pyphen，將無法自動拆解音節。請執行 pip install pyphen")
             return [word] # 如果沒安裝工具，直接回傳原字
-        
-        # 移除非字母字符 (避免標點符號影響)
-        clean_word = re.sub(r'[^a-zA-Z]', '', word)
-        if not clean_word: return [word]
-        
-        hyphenated = self.dic.inserted(clean_word)
-        return hyphenated.split('-')
+        # 與 pet_app.py 共用同一份拆解 (有快取)，各段接起來等於原字
+        return list(split_syllables(word))
 
     def clean_word_text(self, text):
         """
         清理單字文字：去除開頭的數字、點、空白
         例如: "1. ability " -> "ability"
         """
-        # 去除括號內的詞性 (v.) (n.)
-        text = re.sub(r'\(.*?\)', '', text)
-        # 去除開頭的數字和點
-        text = re.sub(r'^[\d\.]+\s*', '', text)
-        return text.strip()
+        return clean_word_text(text)
 
     def parse_docx(self, filename):
         """
         讀取 Word (.docx) 檔案 - 強力相容版
+        直接串流讀取 document.xml 的表格列，不需要 python-docx
         """
-        # 1. 檢查套件
-        if not Document:
-            print("錯誤: 尚未安裝 python-docx。請執行 pip install python-docx")
-            return self.get_mock_data()
-
-        # 2. 檢查檔案是否存在
+        # 1. 檢查檔案是否存在
         if not os.path.exists(filename):
             print(f"❌ 找不到檔案: '{filename}'")
             print("請確認 Word 檔是否放在同一個資料夾，且名稱完全正確。")
             return self.get_mock_data()
 
         print(f"📂 正在讀取檔案: {filename} ...")
-        try:
-            document = Document(filename)
-        except Exception as e:
-            print(f"❌ 讀取檔案失敗: {e}")
-            return self.get_mock_data()
 
         processed_data = []
-        current_day = 1
         word_count = 0
-        table_count = len(document.tables)
-        
-        if table_count > 0:
-            print(f"發現 {table_count} 個表格，正在解析...")
-            
-            for t_idx, table in enumerate(document.tables):
-                # 每個表格前幾行稍微印出來 Debug
-                # if t_idx == 0: print("正在檢查第一個表格結構...")
-
-                for r_idx, row in enumerate(table.rows):
-                    cells = [cell.text.strip() for cell in row.cells]
-                    
-                    # 過濾掉空行
-                    if not any(cells): 
-                        continue
-                    
-                    row_text = "".join(cells)
-                    
-                    # 偵測天數 (例如 "Day 1" 或 "第 1 天")
-                    if "Day" in row_text or ("第" in row_text and "天" in row_text):
-                        nums = re.findall(r'\d+', row_text)
-                        if nums:
-                            current_day = int(nums[0])
-                            # print(f"--> 切換至第 {current_day} 天")
-                        continue
-
-                    # --- 強力解析邏輯 ---
-                    word_cand = ""
-                    ipa_cand = ""
-                    mean_cand = ""
-                    sent_cand = ""
-                    
-                    # 策略：逐格分析內容特性
-                    for cell_text in cells:
-                        if not cell_text: continue
-                        
-                        # 1. 如果包含中文 -> 很大機率是意思
-                        if re.search(r'[\u4e00-\u9fff]', cell_text):
-                            # 如果字數太多，可能是例句的中文翻譯，這裡簡單判斷長度
-                            if len(cell_text) < 50:
-                                if not mean_cand: mean_cand = cell_text
-                            
-                        # 2. 如果包含音標符號 / 或 [ -> 音標
-                        elif ('/' in cell_text or '[' in cell_text) and len(cell_text) < 30:
-                             if not ipa_cand: ipa_cand = cell_text
-
-                        # 3. 如果是英文長句 (含空格) -> 例句
-                        elif len(cell_text.split()) > 3:
-                            if not sent_cand: sent_cand = cell_text
-                            
-                        # 4. 如果是英文短字 -> 可能是單字
-                        # 允許包含一點雜訊(如數字)，稍後清理
-                        elif re.search(r'[a-zA-Z]', cell_text):
-                            # 排除太短的 (如編號 a, b) 除非是 a, I 等字
-                            clean_text = self.clean_word_text(cell_text)
-                            if len(clean_text) >= 1:
-                                if not word_cand: word_cand = clean_text
-
-                    # 只要有抓到單字，我們就收錄 (即使沒有意思或例句)
-                    if word_cand:
-                        # 排除標題行 (例如標題就是 "Word")
-                        if word_cand.lower() in ['word', 'vocabulary', '單字']:
-                            continue
-                            
-                        word_count += 1
-                        # 如果是前幾筆，印出來讓用戶安心
-                        if word_count <= 3:
-                            print(f"   [範例] 抓到: {word_cand} ({mean_cand})")
-
-                        entry = {
-                            "id": word_count,
-                            "day_number": current_day,
-                            "word": word_cand,
-                            "ipa": ipa_cand,
-                            "meaning": mean_cand or "自訂", # 防呆
-                            "sentence": sent_cand or f"Example for {word_cand}", # 防呆
-                            "syllables": self.get_syllables(word_cand)
-                        }
-                        processed_data.append(entry)
+        tables = set()
+
+        def rows():
+            for t_idx, cells in iter_table_rows(filename):
+                tables.add(t_idx)
+                yield t_idx, cells
 
+        try:
+            # 與 pet_app.py 上傳共用同一個解析引擎 (vocab_parser)，兩邊結果一致
+            for row in parse_rows(rows()):
+                word_count += 1
+                # 如果是前幾筆，印出來讓用戶安心
+                if word_count <= 3:
+                    print(f"   [範例] 抓到: {row['word']} ({row['meaning']})")
+                processed_data.append(self.to_entry(word_count, row))
+        except (zipfile.BadZipFile, KeyError, ParseError) as e:
+            print(f"❌ 讀取檔案失敗: {e}")
+            return self.get_mock_data()
+
+        if tables:
+            print(f"發現 {len(tables)} 個表格，解析完成。")
         else:
             print("⚠️ 未發現表格，請確認 Word 檔是否使用表格排版。")
 
@@ -164,6 +98,24 @@ class PetVocabProcessor:
 
         return processed_data
 
+    def iter_entries(self, filename):
+        """一筆一筆產出 pet_vocab_db.json 格式的資料，不把整份題庫留在記憶體 (批次模式用)"""
+        for entry_id, row in enumerate(parse_rows(iter_table_rows(filename)), start=1):
+            yield self.to_entry(entry_id, row)
+
+    def to_entry(self, entry_id, row):
+        """解析引擎的統一格式 -> pet_vocab_db.json 的一筆資料"""
+        return {
+            "id": entry_id,
+            "day_number": row["day"],
+            "word": row["word"],
+            # 解析引擎會拿掉斜線 (App 顯示時自己加)；JSON 沿用原本的 /.../ 格式，與範例資料一致
+            "ipa": f"/{row['ipa']}/" if row["ipa"] else "",
+            "meaning": row["meaning"] or "自訂", # 防呆
+            "sentence": row["example"] or f"Example for {row['word']}", # 防呆
+            "syllables": self.get_syllables(row["word"])
+        }
+
     def get_mock_data(self):
         """生成範例資料 (備用)"""
         print("--> 生成 4 筆模擬資料...")
@@ -179,14 +131,180 @@ class PetVocabProcessor:
             json.dump(data, f, ensure_ascii=False, indent=2)
         print(f"✅ 成功導出 {len(data)} 筆資料至 {filename}")
 
+    def export_ndjson(self, entries, filename):
+        """一行一筆的緊湊 JSON (NDJSON)；先寫暫存檔再換名，中途失敗不會留下半個檔案"""
+        tmp = f"{filename}.{os.getpid()}.tmp"
+        count = 0
+        try:
+            with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n')
+                    count += 1
+            os.replace(tmp, filename)
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        return count
+
+    def build_audio_pack(self, data, filename=AUDIO_PACK_FILE, include_sentences=False, synthesize=None, workers=8):
+        """
+        一次合成所有單字 (可選：例句) 的一般/慢速發音，寫成 pet_app.py 可直接 mmap 的音檔包
+        synthesize 可換成其他後端 (例如 stub_synthesize 離線建包)
+        """
+        texts = [entry["word"] for entry in data]
+        if include_sentences:
+            texts += [entry["sentence"] for entry in data if entry.get("sentence")]
+        print(f"🔊 正在合成 {len(set(texts))} 段發音 (一般 + 慢速)...")
+        count = build_audio_pack(texts, filename, synthesize=synthesize, workers=workers)
+        print(f"✅ 成功寫入 {count} 段音檔至 {filename}")
+
+# ==========================================
+# 批次模式：多份 Word 檔平行轉換，內容沒變的跳過
+# ==========================================
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def expand_inputs(patterns):
+    """檔名或萬用字元 (例如 decks/*.docx) -> 不重複、排序好的 .docx 路徑"""
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        paths += [m for m in matches if m.lower().endswith('.docx') and not os.path.basename(m).startswith('~$')]
+    return sorted(set(os.path.normpath(p) for p in paths))
+
+
+def batch_output_name(path, out_dir):
+    # 不同資料夾裡的同名檔案不能互相覆蓋：檔名後面加上路徑的短雜湊
+    stem = os.path.splitext(os.path.basename(path))[0]
+    tag = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(out_dir, f"{stem}.{tag}.ndjson")
+
+
+_worker_processor = None
+
+def _convert_one(path, out_path):
+    """在子 process 裡執行：解析一份 Word 檔，邊解析邊寫出 NDJSON"""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = PetVocabProcessor()
+    digest = file_hash(path)
+    count = _worker_processor.export_ndjson(_worker_processor.iter_entries(path), out_path)
+    return path, digest, count
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("format") != BATCH_FORMAT: return {}
+    return manifest.get("files", {})
+
+
+def save_manifest(path, files):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({"format": BATCH_FORMAT, "files": files}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def run_batch(patterns, out_dir=BATCH_OUT_DIR, workers=None, force=False):
+    """
+    每份 Word 檔輸出一個 NDJSON (out_dir/<檔名>.<路徑雜湊>.ndjson)。
+    manifest 記下每份檔案上次的內容雜湊，沒變的直接沿用上次的輸出。
+    回傳 {"converted": [...], "skipped": [...], "failed": {...}, "records": n}
+    """
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, BATCH_MANIFEST)
+    manifest = load_manifest(manifest_path)
+    paths = expand_inputs(patterns)
+    result = {"converted": [], "skipped": [], "failed": {}, "records": 0}
+
+    todo = []
+    for path in paths:
+        key = os.path.abspath(path)
+        out_path = batch_output_name(path, out_dir)
+        entry = manifest.get(key)
+        try:
+            digest = file_hash(path)
+        except OSError as e:
+            result["failed"][path] = str(e)
+            continue
+        if not force and entry and entry["hash"] == digest and os.path.exists(out_path):
+            result["skipped"].append(path)
+            result["records"] += entry["count"]
+        else:
+            todo.append((path, out_path))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_convert_one, path, out_path): (path, out_path) for path, out_path in todo}
+            for future in as_completed(futures):
+                path, out_path = futures[future]
+                try:
+                    _path, digest, count = future.result()
+                except Exception as e:  # 任何一份出錯都只記在 failed，其他檔案照樣完成、紀錄照樣存
+                    result["failed"][path] = f"{type(e).__name__}: {e}"
+                    continue
+                manifest[os.path.abspath(path)] = {"hash": digest, "count": count, "output": out_path}
+                result["converted"].append(path)
+                result["records"] += count
+                print(f"   ✅ {path} -> {out_path} ({count} 筆)")
+
+    # 已經不在輸入清單裡的檔案也留著紀錄，下次再出現時一樣可以跳過
+    save_manifest(manifest_path, manifest)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PET 單字表 Word 檔轉換工具")
+    parser.add_argument('inputs', nargs='*', help=f"Word 檔或萬用字元；沒給就轉換 {DEFAULT_DOCX}")
+    parser.add_argument('--batch', action='store_true', help="批次模式：平行轉換、輸出 NDJSON、跳過沒變的檔案")
+    parser.add_argument('--out-dir', default=BATCH_OUT_DIR, help="批次模式的輸出資料夾")
+    parser.add_argument('--workers', type=int, default=None, help="批次模式的 process 數 (預設 CPU 數)")
+    parser.add_argument('--force', action='store_true', help="批次模式：忽略上次的紀錄，全部重建")
+    # --audio: 順便建音檔包；--with-sentences: 例句也合成；--offline-tts: 用靜音替身 (不連網)
+    parser.add_argument('--audio', action='store_true')
+    parser.add_argument('--with-sentences', action='store_true')
+    parser.add_argument('--offline-tts', action='store_true')
+    args = parser.parse_args()
+
+    # 加了引號的萬用字元 (例如 'decks/*.docx') 也走批次，不要當成找不到的檔名改用範例資料
+    if args.batch or len(args.inputs) > 1 or any(glob.has_magic(p) for p in args.inputs):
+        if args.audio or args.with_sentences or args.offline_tts:
+            parser.error("批次模式不建音檔包；--audio / --with-sentences / --offline-tts 請一次轉一份檔案")
+        summary = run_batch(args.inputs or [DEFAULT_DOCX], args.out_dir, args.workers, args.force)
+        for path, error in summary["failed"].items():
+            print(f"   ❌ {path}: {error}")
+        if not (summary["converted"] or summary["skipped"] or summary["failed"]):
+            print(f"   ❌ 找不到符合的 Word 檔: {' '.join(args.inputs)}")
+            sys.exit(1)
+        print(f"完成！轉換 {len(summary['converted'])} 份、沿用 {len(summary['skipped'])} 份、"
+              f"失敗 {len(summary['failed'])} 份，共 {summary['records']} 筆，{summary['seconds']:.2f} 秒。")
+        sys.exit(1 if summary["failed"] else 0)
+
     processor = PetVocabProcessor()
     
     # 請確認這裡的檔名跟您桌面上的檔案一模一樣
-    docx_filename = "更新版PET28天.docx" 
+    docx_filename = args.inputs[0] if args.inputs else DEFAULT_DOCX
     
     final_data = processor.parse_docx(docx_filename)
     
     if final_data:
         processor.export_to_json(final_data)
+        if args.audio:
+            processor.build_audio_pack(
+                final_data,
+                include_sentences=args.with_sentences,
+                synthesize=stub_synthesize if args.offline_tts else None,
+            )
         print("完成！請打開 pet_vocab_db.json 複製內容。")
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+題庫索引
+
+每次 rerun 都要問的問題 (哪幾天有資料、某天有哪些字、筆記本裡的字在哪、
+所有中文意思) 在題庫載入時一次算好，之後都是字典查詢，
+直到題庫內容雜湊改變才重建。
+
+單字存成緊湊的唯讀紀錄 (Word，__slots__)，依 (day, 匯入順序) 排成一個 list；
+某一天、筆記本都只是位置清單 (WordList)，取第 i 個字是 O(1)，
+欄位都是字串 (缺值是 '')，畫面不必再轉型、檢查 NaN。
+Deck 建好後是唯讀的，同一個 process 的所有 session 共用一份。
+"""
+import random
+import re
+import sys
+
+from syllables import decode_syllables, split_syllables
+
+_POS_SPLIT = re.compile(r'[\s&/,.]+')
+
+
+def pos_key(pos):
+    """'(adv & prep)' -> 'adv'：取第一個詞性當分組依據"""
+    parts = _POS_SPLIT.split(str(pos).strip('() ').lower())
+    return parts[0] if parts else ''
+
+
+def length_key(meaning):
+    # 中文意思的長度分組：1-2 字、3-5 字、6-8 字 ...
+    return min(len(meaning) // 3, 4)
+
+
+class Word:
+    """題庫裡的一個字 (唯讀)；重複很多的字串 (word、pos) 用 sys.intern 共用"""
+    __slots__ = ('id', 'day', 'word', 'pos', 'ipa', 'meaning', 'example')
+
+    def __init__(self, row_id, day, word, pos, ipa, meaning, example):
+        self.id = row_id
+        self.day = day
+        self.word = sys.intern(word)
+        self.pos = sys.intern(pos)
+        self.ipa = ipa
+        self.meaning = meaning
+        self.example = example
+
+    def __repr__(self):
+        return f"Word({self.id}, day={self.day}, {self.word!r})"
+
+
+class WordList:
+    """Deck 裡的一組字 (某一天、筆記本...)：只存位置，len / [i] / 切片 / 迭代"""
+    __slots__ = ('_words', '_positions')
+
+    def __init__(self, words, positions):
+        self._words = words
+        self._positions = positions  # 某一天是 range，其他是 tuple
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._words[p] for p in self._positions[i]]
+        return self._words[self._positions[i]]
+
+    def __iter__(self):
+        words = self._words
+        return (words[p] for p in self._positions)
+
+    def words(self):
+        return [w.word for w in self]
+
+
+class DistractorEngine:
+    """
+    測驗的錯誤選項產生器，題庫載入時建好。
+    每題用拒絕取樣 (隨機抽一個位置，跟正解或已選的重複就重抽)，
+    不必每題把整份意思清單複製、過濾一次。
+    plausible=True 時依序優先從「同詞性」「前後一天」「意思長度相近」的分組抽。
+    """
+    MAX_TRIES = 8  # 每個分組最多抽幾次，抽不到就換下一個分組
+
+    def __init__(self, words):
+        by_pos, by_day, by_len, everything = {}, {}, {}, {}
+        for w in words:
+            meaning, pos, day = w.meaning, w.pos, w.day
+            if not meaning: continue
+            everything.setdefault(meaning, None)
+            by_pos.setdefault(pos_key(pos), {}).setdefault(meaning, None)
+            by_day.setdefault(day, {}).setdefault(meaning, None)
+            by_len.setdefault(length_key(meaning), {}).setdefault(meaning, None)
+        self.meanings = tuple(everything)
+        self.by_pos = {k: tuple(v) for k, v in by_pos.items()}
+        self.by_len = {k: tuple(v) for k, v in by_len.items()}
+        # 前後一天合併成一組，查詢時不必再串接
+        self.near_day = {
+            d: tuple(dict.fromkeys(m for nd in (d - 1, d, d + 1) for m in by_day.get(nd, ())))
+            for d in by_day
+        }
+
+    def _draw(self, pool, correct, chosen, k, rng):
+        for _ in range(self.MAX_TRIES):
+            if len(chosen) >= k or not pool: return
+            m = pool[rng.randrange(len(pool))]
+            if m != correct and m not in chosen: chosen.append(m)
+
+    def sample(self, correct, k=3, rng=random, pos=None, day=None, plausible=True):
+        chosen = []
+        if plausible:
+            self._draw(self.by_pos.get(pos_key(pos), ()) if pos else (), correct, chosen, k, rng)
+            self._draw(self.near_day.get(day, ()), correct, chosen, k, rng)
+            self._draw(self.by_len.get(length_key(correct), ()), correct, chosen, k, rng)
+        while len(chosen) < k:
+            before = len(chosen)
+            self._draw(self.meanings, correct, chosen, k, rng)
+            if len(chosen) == before and len(self.meanings) <= k + 1:
+                # 題庫太小湊不滿 k 個：退回逐一檢查，有幾個給幾個
+                chosen += [m for m in self.meanings if m != correct and m not in chosen][:k - len(chosen)]
+                break
+        return chosen
+
+
+class Deck:
+    def __init__(self, store):
+        self.store = store
+        self.version = store.content_hash()
+        self.words = [Word(*row) for row in store.word_rows()]  # 依 (day, 匯入順序)
+        self.day_ranges = {}   # day -> (lo, hi)，對應 self.words[lo:hi]
+        self.word_pos = {}     # word -> (位置, ...)
+        self.positions = {}    # id -> 位置
+        for i, w in enumerate(self.words):
+            self.positions[w.id] = i
+            lo, _hi = self.day_ranges.get(w.day, (i, i))
+            self.day_ranges[w.day] = (lo, i + 1)
+            self.word_pos[w.word] = self.word_pos.get(w.word, ()) + (i,)
+        self.days = frozenset(self.day_ranges)
+        # 匯入時已拆好的音節：word -> ('abil', 'ity')
+        self.syllables = {sys.intern(w): decode_syllables(s) for w, s in store.syllable_rows()}
+        self.distractors = DistractorEngine(self.words)
+        self.meanings = self.distractors.meanings  # 不重複、保持出現順序
+
+    def __len__(self):
+        return len(self.words)
+
+    def has_day(self, day):
+        return day in self.day_ranges
+
+    def word_id_at(self, day, index):
+        """某一天第 index 個字的 id；超出範圍回傳 None"""
+        lo, hi = self.day_ranges.get(day, (0, 0))
+        return self.words[lo + index].id if 0 <= index < hi - lo else None
+
+    def index_of(self, day, row_id):
+        """id 在某一天的第幾個；不在這一天 (已刪除或移到別天) 回傳 None"""
+        lo, hi = self.day_ranges.get(day, (0, 0))
+        i = self.positions.get(row_id)
+        return i - lo if i is not None and lo <= i < hi else None
+
+    def syllables_of(self, word):
+        """存好的音節；不在題庫裡的字 (理論上不會發生) 才現場拆"""
+        chunks = self.syllables.get(word)
+        return chunks if chunks else split_syllables(word)
+
+    def day_words(self, day):
+        """某一天的單字 (WordList)，不複製任何紀錄"""
+        lo, hi = self.day_ranges.get(day, (0, 0))
+        return WordList(self.words, range(lo, hi))
+
+    def build_quiz(self, words, rng, k=3):
+        """一組單字 (WordList) 的聽力測驗：每題正解 + k 個錯誤選項，選項與題目順序都打亂"""
+        questions = []
+        for w in words:
+            options = self.distractors.sample(w.meaning, k, rng, pos=w.pos, day=w.day) + [w.meaning]
+            rng.shuffle(options)
+            questions.append({"word": w.word, "correct": w.meaning, "options": options})
+        rng.shuffle(questions)
+        return questions
+
+    def words_in(self, words):
+        """筆記本 / 複習清單裡的單字 (WordList)，依 (day, 匯入順序) 排列"""
+        return WordList(self.words, tuple(sorted(p for w in words for p in self.word_pos.get(w, ()))))
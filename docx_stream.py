@@ -0,0 +1,94 @@
+"""
+串流讀取 .docx
+
+直接從 zip 讀 word/document.xml，用 iterparse 一邊解析一邊產出表格列，
+不建立 python-docx 的整份物件模型；處理完的節點立刻清掉，
+記憶體不隨文件大小成長，解析時間與文件大小成線性。
+
+每格文字的規則與 python-docx 的 row.cells / cell.text 相同：
+段落以換行串接、橫向合併 (gridSpan) 的格子重複出現、
+縱向合併 (vMerge) 的延續格沿用上一列同一欄的文字。
+"""
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_BODY, _TBL, _TR, _TC, _P = _W + 'body', _W + 'tbl', _W + 'tr', _W + 'tc', _W + 'p'
+_T, _TAB, _BR, _CR = _W + 't', _W + 'tab', _W + 'br', _W + 'cr'
+_GRID_SPAN, _V_MERGE, _VAL = _W + 'gridSpan', _W + 'vMerge', _W + 'val'
+
+
+def iter_docx_blocks(source):
+    """
+    依文件順序產出：
+        ('p', text)                      本文段落 (表格外)
+        ('row', table_index, [cell, ...])  表格的一列 (只含最外層表格)
+    source 可以是檔名或檔案物件 (例如 Streamlit 的 UploadedFile)
+    """
+    with zipfile.ZipFile(source) as zf, zf.open('word/document.xml') as xml:
+        body = None
+        depth = 0          # 目前在第幾層表格裡
+        table_index = -1
+        cells = []         # 目前這一列：[(text, span, vmerge), ...]
+        paras = None       # 目前這一格的段落
+        para = None        # 目前段落的文字片段
+        span, vmerge = 1, None
+        prev_grid = []     # 上一列展開後每一欄的文字 (vMerge 用)
+
+        for event, elem in iterparse(xml, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == _BODY:
+                    body = elem
+                elif tag == _TBL:
+                    depth += 1
+                    if depth == 1:
+                        table_index += 1
+                        prev_grid = []
+                elif depth == 1 and tag == _TC:
+                    paras, span, vmerge = [], 1, None
+                elif tag == _P and (depth == 0 or (depth == 1 and paras is not None)):
+                    para = []
+                continue
+
+            # --- end 事件 ---
+            if para is not None and depth <= 1:
+                if tag == _T: para.append(elem.text or '')
+                elif tag == _TAB: para.append('\t')
+                elif tag in (_BR, _CR): para.append('\n')
+            if tag == _P and para is not None and (depth == 0 or (depth == 1 and paras is not None)):
+                text = ''.join(para)
+                para = None
+                if depth == 0:
+                    yield ('p', text)
+                    if body is not None: body.clear()
+                else:
+                    paras.append(text)
+            elif depth == 1 and tag == _GRID_SPAN:
+                span = int(elem.get(_VAL, 1))
+            elif depth == 1 and tag == _V_MERGE:
+                vmerge = elem.get(_VAL, 'continue')
+            elif depth == 1 and tag == _TC:
+                cells.append(('\n'.join(paras), span, vmerge))
+                paras = None
+            elif depth == 1 and tag == _TR:
+                grid = []
+                for text, n, merge in cells:
+                    if merge == 'continue':
+                        col = len(grid)
+                        text = prev_grid[col] if col < len(prev_grid) else ''
+                    grid.extend([text] * n)
+                yield ('row', table_index, grid)
+                prev_grid = grid
+                cells = []
+                elem.clear()
+            elif tag == _TBL:
+                depth -= 1
+                if depth == 0 and body is not None: body.clear()
+
+
+def iter_table_rows(source):
+    """只要表格：產出 (table_index, [cell, ...])"""
+    for block in iter_docx_blocks(source):
+        if block[0] == 'row':
+            yield block[1], block[2]
@@ -0,0 +1,90 @@
+"""
+畫面 HTML 片段
+
+單字卡、拼寫格、進度圓點的 HTML 只跟 (單字, 已作答的部分, 關卡) 有關，
+同樣的輸入每次 rerun 都產生同樣的字串，所以用 lru_cache 記住：
+卡片沒變的 rerun 直接拿快取。模板事先組好，片段用 join 組合，不再逐字 +=。
+Stage 3 的拼寫格以「前一次的作答」為基礎，每按一個字母只多產生一格。
+"""
+from functools import lru_cache
+from html import escape
+
+FRAGMENT_CACHE_SIZE = 4096
+VOWELS = frozenset("aeiouAEIOU")
+
+_COLORED_WORD = '<div class="colored-word">{}</div>'.format
+_VOWEL = '<span class="char-vowel">{}</span>'.format
+_CONSONANT = '<span class="char-consonant">{}</span>'.format
+_OTHER = '<span>{}</span>'.format
+_SYLLABLE_DOT = '<span class="syllable-dot">•</span>'
+_SPELLING_BOX = '<div class="spelling-box">{}</div>'.format
+_FILLED_SLOT = '<div class="letter-slot">{}</div>'.format
+_EMPTY_SLOT = '<div class="letter-slot letter-empty">&nbsp;</div>'
+_WORD_CARD = """
+    <div class="word-card">
+        {colored}
+        <div style="color:#888; margin-top:5px;">{pos} <span style="color:#d81b60; margin-left:10px;">/{ipa}/</span></div>
+    </div>
+    """.format
+_STEP = ('<div style="width:40px;height:40px;border-radius:50%;background:{color};color:white;display:flex;'
+         'align-items:center;justify-content:center;font-weight:bold;margin:0 10px;box-shadow:{shadow};">{label}</div>').format
+_STEPS = '\n<div style="display:flex;justify-content:center;margin-bottom:20px;">\n    {}\n</div>\n'.format
+_STEP_ON = dict(color="#4caf50", shadow="0 4px 10px rgba(76,175,80,0.4)")
+_STEP_OFF = dict(color="#e0e0e0", shadow="none")
+STEP_LABELS = ("學", "拆", "拼")
+_FEEDBACK = '<div class="{cls}" style="--hold:{hold}s;{style}">{text}</div>'.format
+PASS_BANNER_STYLE = ("background:#66bb6a;color:white;padding:15px;border-radius:15px;"
+                     "text-align:center;font-size:1.8rem;font-weight:bold;")
+
+
+@lru_cache(maxsize=256)
+def _char_html(char):
+    if char in VOWELS: return _VOWEL(char)
+    if char.isalpha(): return _CONSONANT(char)
+    return _OTHER(char)
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def get_colored_word_html(chunks):
+    """chunks：題庫匯入時就拆好的音節 (tuple)，母音/子音分色，音節間加圓點"""
+    return _COLORED_WORD(_SYLLABLE_DOT.join(''.join(map(_char_html, chunk)) for chunk in chunks))
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def get_word_card_html(chunks, pos, ipa):
+    return _WORD_CARD(colored=get_colored_word_html(chunks), pos=pos, ipa=ipa)
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def _filled_slots(answer):
+    # 沿用少一個字母時的結果，只產生最後一格
+    if not answer: return ()
+    return _filled_slots(answer[:-1]) + (_FILLED_SLOT(answer[-1]),)
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def _spelling_slots(length, answer):
+    filled = _filled_slots(answer[:length])
+    return _SPELLING_BOX(''.join(filled) + _EMPTY_SLOT * (length - len(filled)))
+
+
+def get_spelling_slots_html(target_word, current_ans):
+    """拼寫格：已拼的字母 + 空格，數量等於單字去掉空白後的長度"""
+    return _spelling_slots(len(target_word.replace(" ", "")), tuple(current_ans))
+
+
+@lru_cache(maxsize=8)
+def get_steps_html(stage):
+    """學 / 拆 / 拼 三個進度圓點，目前關卡亮綠色"""
+    return _STEPS('\n    '.join(
+        _STEP(label=label, **(_STEP_ON if i == stage else _STEP_OFF))
+        for i, label in enumerate(STEP_LABELS, start=1)))
+
+
+@lru_cache(maxsize=256)
+def get_feedback_html(kind, text, hold):
+    """作答回饋 ('pass' 綠色橫幅 / 'error' 紅框)，hold 秒後由 CSS 動畫淡出；text 是純文字"""
+    text = escape(text)  # 題庫的單字、意思直接放進 HTML 前先跳脫
+    if kind == 'pass':
+        return _FEEDBACK(cls="pass-banner feedback", hold=hold, style=PASS_BANNER_STYLE, text=text)
+    return _FEEDBACK(cls="feedback feedback-error", hold=hold, style="", text=text)
@@ -0,0 +1,332 @@
+"""
+多人同時上線的壓力測試 (headless，不開瀏覽器)
+
+用 Streamlit 的 AppTest 在同一個 process 裡模擬 N 位學習者，每位各自一條執行緒，
+走完：Stage 1 → 2 → 3 (整天的字) → 聽力驗收 → 魔法筆記本。
+發音換成本機替身 (固定延遲、不連網)，每位學習者的隨機行為由種子決定，可以重現。
+
+    python loadtest.py                          # 1 / 4 / 8 位學習者
+    python loadtest.py --learners 1 8 16 32 --words-per-day 5 --json loadtest_results.json
+
+題庫只上傳一次 (由第一位使用者透過上傳畫面)，之後所有學習者共用，與正式環境相同。
+每個人數等級回報：rerun 延遲百分位數、每秒 rerun 數、每個 session 的記憶體、
+進度寫入次數 / 合併次數 / 寫入耗時 / 失敗次數 (存檔爭用)。
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(HERE, 'pet_app.py')
+DEFAULT_LEVELS = (1, 4, 8)
+NEXT, CONFIRM_S2, CROWN, QUIZ = "下一步 ➡", "confirm_s2", "👑", "⚔️ 進入聽力驗收 (Quiz)"
+NOTEBOOK_MODE = "📕 魔法筆記本"
+
+
+def percentile(values, pct):
+    if not values: return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def rss_bytes():
+    """目前 process 的常駐記憶體 (Linux 讀 /proc，其他平台用 ru_maxrss 近似)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def share_runtime():
+    """
+    AppTest 每次執行都把全域的 Runtime 換成自己的替身、結束時清成 None，
+    多個 session 同時執行會互相踩到。壓測期間固定用同一個替身
+    (正式環境一個 process 也只有一個 Runtime)。
+    同理共用一份 ScriptCache：script 只編譯一次，也避開多執行緒同時 ast.parse 的問題。
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    shared = []
+    lock = threading.Lock()
+
+    def current(cls):
+        with lock:
+            if cls._instance is not None and not shared: shared.append(cls._instance)
+            return shared[0] if shared else cls._instance
+
+    def instance(cls):
+        runtime = current(cls)
+        if runtime is None: raise RuntimeError("Runtime hasn't been created!")
+        return runtime
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: current(cls) is not None)
+
+
+class SaveProbe:
+    """量測 ProgressStore 的寫入：次數、耗時、失敗 (資料庫被鎖住等)"""
+    def __init__(self):
+        self.durations = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def install(self, store_cls):
+        probe = self
+        for name in ('save', 'save_reviews'):
+            original = getattr(store_cls, name)
+
+            def timed(self, *args, _original=original, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return _original(self, *args, **kwargs)
+                except Exception:
+                    with probe._lock: probe.errors += 1
+                    raise
+                finally:
+                    with probe._lock: probe.durations.append(time.perf_counter() - start)
+            setattr(store_cls, name, timed)
+
+    def reset(self):
+        with self._lock:
+            self.durations, self.errors = [], 0
+
+
+class Learner:
+    """一位模擬學習者：一個 AppTest session，記錄每次 rerun 的延遲"""
+    def __init__(self, uid, day_words, rng, timeout, mistake_rate):
+        from streamlit.testing.v1 import AppTest
+        self.uid = uid
+        self.day_words = day_words
+        self.rng = rng
+        self.mistake_rate = mistake_rate
+        self.latencies = []
+        self.at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+        self.at.query_params['uid'] = uid
+
+    def run(self, element=None):
+        start = time.perf_counter()
+        self.at = (element.run() if element is not None else self.at.run())
+        self.latencies.append(time.perf_counter() - start)
+        if self.at.exception:
+            raise RuntimeError(f"{self.uid}: {self.at.exception[0].message}")
+
+    def button(self, label=None, key=None):
+        for b in self.at.button:
+            if (key is not None and b.key == key) or (label is not None and b.label == label):
+                return b
+        raise LookupError(f"{self.uid}: 找不到按鈕 {label or key}")
+
+    def click(self, label=None, key=None):
+        self.run(self.button(label, key).click())
+
+    def target(self):
+        return self.day_words[self.at.session_state.word_index]
+
+    def study_word(self):
+        word = self.target()
+        self.click(NEXT)
+        # Stage 2：依序點音節；偶爾先點錯再按 ↺ 重來
+        if self.rng.random() < self.mistake_rate:
+            tiles = [b for b in self.at.button if b.key and b.key.startswith('s2_')]
+            if tiles:
+                self.run(self.rng.choice(tiles).click())
+                self.click("↺")
+        built = ''
+        goal = word.replace(' ', '')
+        while built != goal:
+            tiles = [b for b in self.at.button if b.key and b.key.startswith('s2_') and goal[len(built):].startswith(b.label)]
+            if not tiles: break
+            built += tiles[0].label
+            self.run(tiles[0].click())
+        self.click(key=CONFIRM_S2)
+        # Stage 3：依序點字母
+        for ch in goal:
+            tiles = [b for b in self.at.button if b.key and b.key.startswith('s3_char_') and b.label == ch]
+            if not tiles: break
+            self.run(tiles[0].click())
+        self.click(CROWN)
+
+    def take_quiz(self):
+        self.click(QUIZ)
+        for _ in range(len(self.at.session_state.quiz_data)):
+            q = self.at.session_state.quiz_data[self.at.session_state.quiz_q_index]
+            wrong = [o for o in q['options'] if o != q['correct']]
+            pick = self.rng.choice(wrong) if wrong and self.rng.random() < self.mistake_rate else q['correct']
+            key = f"opt_{pick}_{self.at.session_state.quiz_q_index}"
+            self.click(key=key)
+
+    def browse_notebook(self):
+        if not self.at.sidebar.radio: return
+        self.run(self.at.sidebar.radio[0].set_value(NOTEBOOK_MODE))
+        if any(b.label == NEXT for b in self.at.button):
+            self.click(NEXT)
+
+    def session(self):
+        self.run()
+        while self.at.session_state.word_index < len(self.day_words):
+            self.study_word()
+        self.take_quiz()
+        self.browse_notebook()
+
+
+def upload_deck(docx_path, timeout):
+    """第一位使用者透過上傳畫面匯入題庫，回傳耗時 (秒)"""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    at.query_params['uid'] = 'uploader'
+    at.run()
+    if at.session_state.data_loaded:
+        return 0.0  # 題庫已經存在
+    with open(docx_path, 'rb') as f:
+        payload = f.read()
+    start = time.perf_counter()
+    at.sidebar.file_uploader[0].set_value(
+        (os.path.basename(docx_path), payload,
+         "application/vnd.openxmlformats-officedocument.wordprocessingml.document"))
+    at.run()
+    if at.exception: raise RuntimeError(at.exception[0].message)
+    return time.perf_counter() - start
+
+
+def run_level(n, args, day_words, probe, writer_stats):
+    probe.reset()
+    before = writer_stats()
+    learners = [Learner(f"lt{n}_{i}", day_words, random.Random(args.seed * 100003 + n * 1009 + i),
+                        args.timeout, args.mistake_rate) for i in range(n)]
+    rss_before = rss_bytes()
+    errors = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        futures = [pool.submit(l.session) for l in learners]
+        for f in futures:
+            try: f.result()
+            except Exception as e: errors.append(str(e))
+    wall = time.perf_counter() - start
+    rss_after = rss_bytes()
+    after = writer_stats()
+
+    latencies = [t for l in learners for t in l.latencies]
+    saves = list(probe.durations)
+    return {
+        "learners": n,
+        "reruns": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p90": round(percentile(latencies, 90) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies, default=0) * 1000, 2),
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        "rss_mb_per_session": round((rss_after - rss_before) / n / 2**20, 3),
+        "saves": {
+            "writes": len(saves),
+            "coalesced": after["coalesced"] - before["coalesced"],
+            "p50_ms": round(percentile(saves, 50) * 1000, 2),
+            "p99_ms": round(percentile(saves, 99) * 1000, 2),
+            "max_ms": round(max(saves, default=0) * 1000, 2),
+            "errors": probe.errors,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PET 單字 App 多人壓力測試")
+    parser.add_argument('--learners', type=int, nargs='+', default=list(DEFAULT_LEVELS))
+    parser.add_argument('--words-per-day', type=int, default=4)
+    parser.add_argument('--tts-latency', type=float, default=0.05, help="發音替身的延遲 (秒)")
+    parser.add_argument('--mistake-rate', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120.0, help="單次 rerun 的逾時 (秒)")
+    parser.add_argument('--json', default='loadtest_results.json', help="結果輸出的 JSON 檔 ('-' 表示 stdout)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    import audio_cache
+    import bench
+    import progress_store
+
+    def fake_tts(text, lang='en', slow=False):
+        time.sleep(args.tts_latency)
+        return b'\xff\xfb' + text.encode('utf-8')
+    audio_cache.gtts_synthesize = fake_tts
+
+    share_runtime()
+    probe = SaveProbe()
+    probe.install(progress_store.ProgressStore)
+    writers = []
+    original_init = progress_store.ProgressWriter.__init__
+
+    def tracked_init(self, *a, **kw):
+        original_init(self, *a, **kw)
+        writers.append(self)
+    progress_store.ProgressWriter.__init__ = tracked_init
+
+    def writer_stats():
+        return {"coalesced": sum(w.coalesced for w in writers)}
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='pet_load_')
+    # 背景寫入執行緒在 process 結束時 (atexit) 才寫完，暫存資料夾要比它晚刪
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    original_cwd = os.getcwd()
+    os.chdir(workdir)  # 題庫、進度、音檔快取都寫在暫存資料夾
+    words = bench.make_words(args.words_per_day * bench.DAYS, args.seed)
+    docx_path = bench.write_docx(os.path.join(workdir, 'deck.docx'), words, 'header')
+    day_words = [w['word'] for w in words if w['day'] == 1]
+
+    upload_s = upload_deck(docx_path, args.timeout)
+    print(f"📤 上傳題庫 {len(words)} 字: {upload_s * 1000:.0f} ms", flush=True)
+
+    levels = []
+    for n in args.learners:
+        result = run_level(n, args, day_words, probe, writer_stats)
+        levels.append(result)
+        lat = result["latency_ms"]
+        print(f"👥 {n:>3} 人  rerun {result['reruns']:>5}  {result['throughput_rps']:>7.1f}/s  "
+              f"p50 {lat['p50']:>7.1f} ms  p90 {lat['p90']:>7.1f} ms  p99 {lat['p99']:>7.1f} ms  "
+              f"記憶體 {result['rss_mb_per_session']:.2f} MB/人  存檔 p99 {result['saves']['p99_ms']:.1f} ms  "
+              f"錯誤 {len(result['errors']) + result['saves']['errors']}", flush=True)
+        for err in result["errors"][:3]: print(f"   ⚠️ {err}")
+
+    for w in writers: w.flush()
+    report = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": sys.version.split()[0],
+        "seed": args.seed,
+        "words_per_day": args.words_per_day,
+        "tts_latency_s": args.tts_latency,
+        "upload_ms": round(upload_s * 1000, 2),
+        "levels": levels,
+    }
+    os.chdir(original_cwd)
+    if args.json == '-':
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    else:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 結果已寫入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,24 @@
 import streamlit as st
-import pandas as pd
+from streamlit.errors import StreamlitAPIException
 import random
 import time
-import json
 import os
-import re
-import base64
-from gtts import gTTS
-from io import BytesIO
-try:
-    import docx
-except ImportError:
-    st.error("請先安裝套件: pip install python-docx")
+import uuid
+from audio_cache import AudioCache, AudioPrefetcher
+from audio_pack import AUDIO_PACK_FILE, AudioPack
+from vocab_store import open_vocab_store
+from deck import Deck
+from search_index import SearchIndex
+from progress_store import PROGRESS_DB_FILE, ProgressStore, ProgressWriter
+from srs import QUIZ_CORRECT, QUIZ_WRONG, SPELL_FAIL, SPELL_PASS, ReviewQueue
+from fragments import get_feedback_html, get_spelling_slots_html, get_steps_html, get_word_card_html
+from tracing import begin_trace, span, span_totals, traced
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# 每次 rerun 的耗時紀錄：上一次的在這裡收尾、寫進 pet_trace.jsonl
+if 'trace_session' not in st.session_state: st.session_state.trace_session = uuid.uuid4().hex[:12]
+st.session_state.trace, st.session_state.last_trace = begin_trace(
+    st.session_state.get('trace'), st.session_state.trace_session)
 
 # ==========================================
 # 1. 設定與 CSS (核彈級手機排版修正)
@@ -95,7 +102,13 @@ ghibli_css = """
         /* 針對底部 3 個功能鍵 (退格/清空/送出) 特別調整為 33% 寬度 */
         /* 我們稍後在 Python 用 columns(3) 產生，CSS 會自動適配 */
     }
+</style>
+"""
+with span('css'): st.markdown(ghibli_css, unsafe_allow_html=True)
 
+# 單字卡、拼字、測驗的樣式：有題庫、真的要顯示學習畫面時才送出 (見主程式邏輯)
+study_css = """
+<style>
     /* 答案列 */
     .answer-column {
         background-color: #fff; padding: 10px; border-radius: 20px;
@@ -116,6 +129,7 @@ ghibli_css = """
     
     /* 音頻播放器隱藏 (消除黑線) */
     audio { display: none; width: 0; height: 0; }
+    div[data-testid="stAudio"] { display: none; }
     
     /* 視覺化元素 */
     .colored-word { font-size: 3.5rem; font-weight: 900; letter-spacing: 1px; margin-bottom: 10px; }
@@ -123,6 +137,17 @@ ghibli_css = """
     .char-consonant { color: #29b6f6 !important; }
     .syllable-dot { color: #ddd !important; font-size: 1.5rem; margin: 0 2px; }
     
+    /* 作答回饋：顯示一下後由瀏覽器自己淡出 (--hold 秒)，伺服器不必等 */
+    .feedback {
+        max-height: 200px; overflow: hidden;
+        animation: feedback-out 0.4s ease var(--hold, 1.5s) forwards;
+    }
+    @keyframes feedback-out { to { opacity: 0; max-height: 0; padding: 0; margin: 0; border-width: 0; } }
+    .feedback-error {
+        background-color: #ffebee; color: #c62828 !important; padding: 12px 16px;
+        border-radius: 10px; border: 2px solid #ef9a9a; font-weight: bold; margin-bottom: 10px;
+    }
+
     .example-sentence {
         background-color: #f0f4c3; padding: 12px; border-radius: 10px;
         margin-top: 15px; font-style: italic; text-align: left;
@@ -158,134 +183,353 @@ ghibli_css = """
     }
 </style>
 """
-st.markdown(ghibli_css, unsafe_allow_html=True)
 
 # ==========================================
 # 2. 核心功能
 # ==========================================
-DB_FILE = 'pet_database.csv'
-SAVE_FILE = 'user_save.json'
-
+DB_FILE = 'pet_database.db'
+LEGACY_CSV_FILE = 'pet_database.csv'  # 舊版資料庫，第一次啟動時自動搬進 DB_FILE
+SAVE_FILE = 'user_save.json'  # 舊版的全域存檔，第一次啟動時搬進 PROGRESS_DB_FILE
+PREFETCH_AHEAD = 3       # 預先合成後面幾張卡的發音
+AUDIO_CARD_WAIT = 0.3    # 換卡時最多等音檔幾秒，等不到就先不自動播放
+AUDIO_PRESS_WAIT = 3.0   # 按下 🔊 時最多等幾秒
+REVIEW_BATCH = 20        # 複習模式一輪最多幾個到期的字
+FEEDBACK_HOLD = {'error': 1.5, 'pass': 0.5}  # 作答回饋停留幾秒後淡出
+
+@st.cache_resource(max_entries=2)
+def open_store(file_id):
+    return open_vocab_store(DB_FILE, legacy_csv=LEGACY_CSV_FILE)
+
+def get_vocab_store():
+    # 以資料庫檔案的 (裝置, inode) 當 key：檔案被整個換掉時要重開連線
+    file_id = None
+    if os.path.exists(DB_FILE):
+        stat = os.stat(DB_FILE)
+        file_id = (stat.st_dev, stat.st_ino)
+    return open_store(file_id)
+
+@st.cache_resource(max_entries=2)
+def load_deck(_store, version):
+    # 同一個 process 的所有 session 共用一份唯讀題庫；
+    # version 是題庫內容雜湊，內容一改就是新的 key，舊的自然被淘汰
+    return Deck(_store)
+
+def get_deck():
+    return load_deck(store, store.content_hash())
+
+@st.cache_resource(max_entries=2)
+def load_search_index(_deck, version):
+    # 第一次有人搜尋時才建 (不拖慢開頁)，之後所有 session 共用；題庫內容一改就換新的
+    return SearchIndex(_deck.words)
+
+@st.cache_resource
+def get_progress_writer():
+    # 每個 process 一條背景寫入執行緒，所有 session 共用
+    return ProgressWriter(ProgressStore(PROGRESS_DB_FILE))
+
+def get_user_id():
+    # 學習者身分放在網址 ?uid=...，加入書籤就能接著上次的進度
+    uid = st.query_params.get("uid")
+    if not uid:
+        uid = uuid.uuid4().hex[:12]
+        st.query_params["uid"] = uid
+    return uid
+
+@traced('load_state')
 def load_save_state():
-    if os.path.exists(SAVE_FILE):
-        try:
-            with open(SAVE_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-        except: pass
-    return {}
-
-def save_current_state():
+    writer = get_progress_writer()
+    saved = writer.load(st.session_state.user_id)
+    if not saved and writer.store.migrate_legacy_save(SAVE_FILE, st.session_state.user_id):
+        saved = writer.load(st.session_state.user_id)
+    return saved
+
+@traced('save')
+def save_current_state(urgent=False):
+    # 只記下快照，由背景執行緒合併後寫入；換關卡/換天時 urgent=True 立即排入。
+    # 拼圖的每一下點擊不要 urgent，連續點擊才能合併成一次寫入。
+    # 寫入執行緒屬於整個 process，分頁關掉後待寫的快照照樣在 WRITE_BEHIND_DELAY 內寫入
     state = {
         "current_day": st.session_state.current_day,
         "word_index": st.session_state.word_index,
+        "word_id": current_word_id(),
         "stage": st.session_state.stage,
         "notebook": list(st.session_state.notebook),
         "completed_days": list(st.session_state.completed_days),
-        "stage2_pool": st.session_state.stage2_pool,
-        "stage2_ans": st.session_state.stage2_ans,
-        "stage3_pool": st.session_state.stage3_pool,
-        "stage3_ans": st.session_state.stage3_ans
+        "stage2_pool": list(st.session_state.stage2_pool),
+        "stage2_ans": list(st.session_state.stage2_ans),
+        "stage3_pool": list(st.session_state.stage3_pool),
+        "stage3_ans": list(st.session_state.stage3_ans)
     }
-    with open(SAVE_FILE, 'w', encoding='utf-8') as f: json.dump(state, f)
-
-def play_audio_html(text=None, slow_mode=False):
+    st.session_state.word_id = state["word_id"]
+    get_progress_writer().mark_dirty(st.session_state.user_id, state, urgent=urgent)
+
+def read_word_file(uploaded_file):
+    # Word 解析器只有上傳時才載入；直接取列，不經過 DataFrame
+    from docx_stream import iter_table_rows
+    from vocab_parser import parse_rows
+    return list(parse_rows(iter_table_rows(uploaded_file)))
+
+def current_word_id():
+    # 森林闖關目前這張卡的單字 id；筆記本/複習模式的 word_index 不是某一天的位置
+    if st.session_state.get('mode', 'normal') != 'normal': return None
+    return deck.word_id_at(st.session_state.current_day, st.session_state.word_index)
+
+def sync_word_position():
+    # 題庫重新匯入後，依單字 id 找回目前這張卡；字被刪掉了就從這張卡的第一關重來
+    st.session_state.deck_version = deck.version
+    word_id = st.session_state.get('word_id')
+    if word_id is None or st.session_state.get('mode', 'normal') != 'normal': return
+    index = deck.index_of(st.session_state.current_day, word_id)
+    if index is not None:
+        st.session_state.word_index = index
+        return
+    st.session_state.stage = 1
+    for key in ('stage2_pool', 'stage2_ans', 'stage3_pool', 'stage3_ans'):
+        st.session_state[key] = []
+
+# 一輪學習 (一天、一次筆記本/複習) 裡每個字只評一次分：Stage 3 的拼寫結果先記著 (取最差的)，
+# 測驗作答時跟測驗結果合併、送出一次；沒做測驗就換天/換模式時，記著的結果各自送出
+def note_review(word, quality):
+    pending = st.session_state.pending_grades
+    pending[word] = min(pending.get(word, quality), quality)
+
+@traced('save')
+def record_review(word, quality):
+    # 更新間隔重複排程，紀錄交給背景寫入
+    quality = min(quality, st.session_state.pending_grades.pop(word, quality))
+    rec = st.session_state.reviews.grade(word, quality)
+    get_progress_writer().mark_review(st.session_state.user_id, rec.as_row())
+
+def flush_reviews():
+    for word, quality in list(st.session_state.pending_grades.items()):
+        record_review(word, quality)
+
+def next_review_batch():
+    # 只排題庫裡還有的字：words_in 會略過不在題庫裡的字，整批都是的話會一直顯示「無資料」
+    return [w for w in st.session_state.reviews.due_words(limit=REVIEW_BATCH) if w in deck.word_pos]
+
+def drop_deleted_reviews():
+    # 題庫重新匯入 (或剛開 session) 時，被刪掉的字不再排進這個 session 的複習；
+    # 資料庫裡的紀錄留著，同一個字之後加回來還能接著複習
+    known = deck.word_pos
+    st.session_state.reviews.prune(known)
+    st.session_state.review_words = [w for w in st.session_state.review_words if w in known]
+    pending = st.session_state.get('pending_grades', {})
+    for word in [w for w in pending if w not in known]: del pending[word]
+
+@st.cache_resource
+def get_audio_cache():
+    # 每個 process 一份；磁碟上的快取資料夾則由所有 process 共用
+    return AudioCache()
+
+@st.cache_resource
+def get_audio_prefetcher():
+    return AudioPrefetcher(get_audio_cache())
+
+@st.cache_resource(max_entries=2)
+def open_audio_pack(file_id):
+    # convert.py --audio 建好的音檔包；有的話執行時完全不需要 TTS
+    if file_id is None: return None
+    try: return AudioPack(AUDIO_PACK_FILE)
+    except ValueError as e: st.warning(f"音檔包無法讀取: {e}")
+    return None
+
+def get_audio_pack():
+    # 以音檔包的 (裝置, inode, 修改時間) 當 key：伺服器開著時才放上或重建的音檔包也會用到
+    file_id = None
+    if os.path.exists(AUDIO_PACK_FILE):
+        stat = os.stat(AUDIO_PACK_FILE)
+        file_id = (stat.st_dev, stat.st_ino, stat.st_mtime)
+    return open_audio_pack(file_id)
+
+@traced('audio_prefetch')
+def prefetch_audio(words, slow_mode=False):
+    # 背景合成，不等結果；音檔包裡已有的字不必合成
+    pack = get_audio_pack()
+    words = [str(w) for w in words if w]
+    if pack: words = [w for w in words if pack.get(w, slow=slow_mode) is None]
+    get_audio_prefetcher().prefetch(words, lang='en', slow=slow_mode)
+
+@traced('audio')
+def play_audio_html(text=None, slow_mode=False, wait=AUDIO_PRESS_WAIT):
     if text:
-        try:
-            tts = gTTS(text=text, lang='en', slow=slow_mode)
-            fp = BytesIO()
-            tts.write_to_fp(fp)
-            b64 = base64.b64encode(fp.getvalue()).decode()
-            sound_html = f"""<audio autoplay style="width:0;height:0;display:none;"><source src="data:audio/mp3;base64,{b64}" type="audio/mp3"></audio>"""
-            st.markdown(sound_html, unsafe_allow_html=True)
-        except: pass
+        pack = get_audio_pack()
+        audio_bytes = pack.get(text, slow=slow_mode) if pack else None
+        if audio_bytes is None:
+            audio_bytes = get_audio_prefetcher().get_ready(text, lang='en', slow=slow_mode, wait=wait)
+        if audio_bytes is None:
+            # 還沒合成好 (或合成失敗，原因記在 log)：不擋畫面，讓學習者稍後再按
+            st.caption("🔇 發音準備中，可稍後按 🔊 再聽一次")
+            return
+        # 交給 media file manager：音檔以內容雜湊存一份、用 /media/ 網址提供，
+        # 前端只收到一個短網址，不再把整段 base64 塞進每次 rerun 的訊息
+        st.audio(bytes(audio_bytes), format="audio/mp3", autoplay=True)
+
+def set_feedback(kind, text):
+    # 答錯/通過的提示留到下一次畫面顯示，不在 script 執行緒裡 time.sleep 等使用者看完
+    st.session_state.feedback = (kind, text)
+
+def show_feedback():
+    # 只顯示一次：下一次互動就消失；停留秒數交給瀏覽器端的 CSS 動畫
+    feedback = st.session_state.pop('feedback', None)
+    if feedback:
+        kind, text = feedback
+        st.markdown(get_feedback_html(kind, text, FEEDBACK_HOLD[kind]), unsafe_allow_html=True)
 
 def play_click():
     pop = """<audio autoplay style="display:none;"><source src="https://www.soundjay.com/buttons/sounds/button-16.mp3" type="audio/mp3"></audio>"""
     st.markdown(pop, unsafe_allow_html=True)
 
-def split_syllables_chunk(word):
-    if " " in word: return word.split(" ")
-    chunks = []
-    temp = word
-    while len(temp) > 0:
-        cut = 3 if len(temp) > 5 else 2
-        if len(temp) <= 3: chunks.append(temp); break
-        chunks.append(temp[:cut])
-        temp = temp[cut:]
-    return chunks
-
-def get_colored_word_html(word):
-    chunks = split_syllables_chunk(word)
-    html = ""
-    vowels = "aeiouAEIOU"
-    for i, chunk in enumerate(chunks):
-        for char in chunk:
-            if char in vowels: html += f'<span class="char-vowel">{char}</span>'
-            elif char.isalpha(): html += f'<span class="char-consonant">{char}</span>'
-            else: html += f'<span>{char}</span>'
-        if i < len(chunks) - 1: html += '<span class="syllable-dot">•</span>'
-    return f'<div class="colored-word">{html}</div>'
-
-def get_spelling_slots_html(target_word, current_ans):
-    html = '<div class="spelling-box">'
-    target_clean = target_word.replace(" ", "")
-    target_len = len(target_clean)
-    ans_len = len(current_ans)
-    for i in range(target_len):
-        if i < ans_len:
-            char = current_ans[i]
-            html += f'<div class="letter-slot">{char}</div>'
-        else:
-            html += '<div class="letter-slot letter-empty">&nbsp;</div>'
-    html += '</div>'
-    return html
+# Stage 2 / 3 的拼圖區是獨立的 fragment：點一個方塊只重跑拼圖區，
+# 不重跑整頁 (CSS、側邊欄 30 天按鈕、題庫查詢、進度圓點)；換關卡時才整頁 rerun
+def trace_fragment():
+    # fragment 重跑時頁面上方的 begin_trace 不會執行，在這裡另開一段紀錄
+    ctx = get_script_run_ctx()
+    if ctx is not None and getattr(ctx, 'fragment_ids_this_run', None):
+        st.session_state.trace, st.session_state.last_trace = begin_trace(
+            st.session_state.get('trace'), st.session_state.trace_session, kind='fragment')
+
+def fragment_click():
+    # fragment 重跑不會經過頁面上方的 trigger_click，在這裡播
+    if st.session_state.trigger_click:
+        play_click()
+        st.session_state.trigger_click = False
+
+def rerun_puzzle():
+    # 點擊是在 fragment 重跑中處理的就只重跑拼圖區；整頁執行中 (例如 AppTest) 退回整頁 rerun
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
 
-# ==========================================
-# 3. Word 解析器
-# ==========================================
-def parse_word_file(uploaded_file):
-    doc = docx.Document(uploaded_file)
-    data = []
-    day_counter = 1
-    for table in doc.tables:
-        if len(table.rows) < 2: continue
-        for row in table.rows[1:]:
-            cells = row.cells
-            if len(cells) >= 4:
-                raw_word = cells[1].text.strip()
-                if not raw_word: continue
-                match = re.match(r"([a-zA-Z\s\-\/']+)[\s]*(\(.*\))?", raw_word)
-                clean_word = raw_word
-                pos = ""
-                if match:
-                    clean_word = match.group(1).strip()
-                    pos = match.group(2).strip() if match.group(2) else ""
-                
-                raw_ipa = cells[2].text.strip() if len(cells) > 2 else ""
-                raw_meaning = cells[3].text.strip() if len(cells) > 3 else ""
-                raw_example = cells[4].text.strip() if len(cells) > 4 else ""
-                ipa = raw_ipa.replace("/", "")
-                data.append({
-                    "day": day_counter, "word": clean_word, "pos": pos, "ipa": ipa, "meaning": raw_meaning, "example": raw_example
-                })
-        day_counter += 1
-        if day_counter > 28: day_counter = 28
-    return pd.DataFrame(data)
+@st.fragment
+def syllable_puzzle(target):
+    trace_fragment()
+    fragment_click()
+    curr = "".join(st.session_state.stage2_ans)
+    st.markdown(f'<div class="answer-column">{curr}</div>', unsafe_allow_html=True)
+
+    cols = st.columns(4) # 強制橫排 4 欄
+    for i, s in enumerate(st.session_state.stage2_pool):
+        if s not in st.session_state.stage2_ans:
+            if cols[i%4].button(s, key=f"s2_{i}"):
+                st.session_state.stage2_ans.append(s)
+                st.session_state.trigger_click = True
+                save_current_state()
+                rerun_puzzle()
+            
+    c1, c2 = st.columns(2)
+    if c1.button("↺"):
+        st.session_state.stage2_ans = []
+        st.session_state.trigger_click = True
+        save_current_state()
+        rerun_puzzle()
+    if c2.button("✅", key="confirm_s2"):
+        if "".join(st.session_state.stage2_ans) == target.replace(" ", ""):
+            st.success("Correct!")
+            chars = list(target.replace(" ", ""))
+            random.shuffle(chars)
+            st.session_state.stage3_pool = chars
+            st.session_state.stage3_ans = []
+            st.session_state.stage = 3
+            save_current_state(urgent=True)
+            st.rerun()
+        else: st.error("錯誤")
+
+@st.fragment
+def spelling_puzzle(target):
+    trace_fragment()
+    fragment_click()
+    # 視覺化底線
+    with span('html'): spelling_html = get_spelling_slots_html(target, st.session_state.stage3_ans)
+    st.markdown(spelling_html, unsafe_allow_html=True)
+    
+    is_finished = "".join(st.session_state.stage3_ans) == target.replace(" ", "")
+
+    if not is_finished:
+        st.write("👇 點擊字母：")
+        cols = st.columns(4) # 強制橫排 4 欄
+        for i, char in enumerate(st.session_state.stage3_pool):
+            if cols[i%4].button(char, key=f"s3_char_{i}"):
+                st.session_state.stage3_ans.append(char)
+                st.session_state.stage3_pool.pop(i)
+                st.session_state.trigger_click = True
+                save_current_state()
+                rerun_puzzle()
+    else:
+        st.info("拼寫完成！請送出")
+
+    st.markdown("<br>", unsafe_allow_html=True)
+    ctrl_c1, ctrl_c2, ctrl_c3 = st.columns(3)
+    if ctrl_c1.button("⌫"): 
+        if st.session_state.stage3_ans:
+            last_char = st.session_state.stage3_ans.pop()
+            st.session_state.stage3_pool.append(last_char)
+            st.session_state.trigger_click = True
+            save_current_state()
+            rerun_puzzle()
+    if ctrl_c2.button("↺"): 
+        st.session_state.stage3_pool.extend(st.session_state.stage3_ans)
+        st.session_state.stage3_ans = []
+        st.session_state.trigger_click = True
+        save_current_state()
+        rerun_puzzle()
+    
+    with ctrl_c3:
+        st.markdown('<div class="confirm-btn">', unsafe_allow_html=True)
+        if st.button("👑"): 
+            user_word = "".join(st.session_state.stage3_ans)
+            target_clean = target.replace(" ", "")
+            if user_word.lower() == target_clean.lower():
+                note_review(target, SPELL_PASS)
+                set_feedback('pass', "✅ PASS")
+                st.session_state.word_index += 1
+                st.session_state.stage = 1
+                save_current_state(urgent=True)
+                st.rerun()
+            else:
+                st.error("拼錯囉！")
+                note_review(target, SPELL_FAIL)
+                if target not in st.session_state.notebook:
+                    st.session_state.notebook.add(target)
+                    st.toast(f"已加入筆記本📕")
+                    save_current_state()
+        st.markdown('</div>', unsafe_allow_html=True)
+
+# 側邊欄查單字：每次送出查詢只重跑這個 fragment
+@st.fragment
+def search_box():
+    trace_fragment()
+    query = st.text_input("🔍 查單字", placeholder="英文單字或中文意思", key='search_query')
+    if not query.strip(): return
+    with span('search'): results = load_search_index(deck, deck.version).search(query)
+    if not results:
+        st.caption("找不到符合的單字")
+        return
+    for w in results:
+        if st.button(w.word, key=f"goto_{w.id}"):
+            # 選項 radio 已經畫出來了，要等整頁 rerun、畫 radio 之前才能切換模式
+            st.session_state.jump_to = (w.day, w.id)
+            st.rerun()
+        st.caption(f"{w.pos} {w.meaning} · Day {w.day}")
 
 # ==========================================
-# 4. 初始化
+# 3. 初始化
 # ==========================================
-if 'df' not in st.session_state:
-    if os.path.exists(DB_FILE):
-        st.session_state.df = pd.read_csv(DB_FILE)
-        st.session_state.data_loaded = True
-    else:
-        st.session_state.df = pd.DataFrame()
-        st.session_state.data_loaded = False
+with span('deck'):
+    store = get_vocab_store()
+    if 'data_loaded' not in st.session_state:
+        st.session_state.data_loaded = not store.is_empty()
+    deck = get_deck()
+
+if 'user_id' not in st.session_state:
+    st.session_state.user_id = get_user_id()
 
 if 'initialized' not in st.session_state:
     saved = load_save_state()
     st.session_state.current_day = saved.get("current_day", 1)
     st.session_state.word_index = saved.get("word_index", 0)
+    st.session_state.word_id = saved.get("word_id")
     st.session_state.stage = saved.get("stage", 1)
     st.session_state.notebook = set(saved.get("notebook", []))
     st.session_state.completed_days = set(saved.get("completed_days", []))
@@ -293,7 +537,13 @@ if 'initialized' not in st.session_state:
     st.session_state.stage2_ans = saved.get("stage2_ans", [])
     st.session_state.stage3_pool = saved.get("stage3_pool", [])
     st.session_state.stage3_ans = saved.get("stage3_ans", [])
+    st.session_state.reviews = ReviewQueue(get_progress_writer().load_reviews(st.session_state.user_id))
+    st.session_state.review_words = []
     st.session_state.initialized = True
+if st.session_state.get('deck_version') != deck.version:
+    drop_deleted_reviews()
+    sync_word_position()
+st.session_state.trace.tags.update(mode=st.session_state.get('mode', 'normal'), stage=st.session_state.stage)
 
 if 'stage2_pool' not in st.session_state: st.session_state.stage2_pool = []
 if 'stage2_ans' not in st.session_state: st.session_state.stage2_ans = []
@@ -309,40 +559,74 @@ if 'daily_quiz_active' not in st.session_state: st.session_state.daily_quiz_acti
 if 'quiz_q_index' not in st.session_state: st.session_state.quiz_q_index = 0
 if 'quiz_score' not in st.session_state: st.session_state.quiz_score = 0
 if 'quiz_data' not in st.session_state: st.session_state.quiz_data = []
+if 'quiz_round' not in st.session_state: st.session_state.quiz_round = 0
+if 'pending_grades' not in st.session_state: st.session_state.pending_grades = {}
 
 # ==========================================
-# 5. 側邊欄
+# 4. 側邊欄
 # ==========================================
-with st.sidebar:
+with st.sidebar, span('sidebar'):
     st.title("🎒 設定")
     slow_audio = st.checkbox("🐢 慢速發音", value=False)
     
     if st.session_state.data_loaded:
         if st.button("🗑️ 換檔案"):
-            if os.path.exists(DB_FILE): os.remove(DB_FILE)
-            if os.path.exists(SAVE_FILE): os.remove(SAVE_FILE)
+            store.clear()
+            get_progress_writer().clear_all()
             st.session_state.data_loaded = False
             st.session_state.initialized = False
             st.rerun()
+
+        # 重新上傳修改過的單字表：只套用有差異的列，學習進度、筆記本都保留
+        update_file = st.file_uploader("🔄 更新題庫 (保留進度)", type=['docx'], key='update_file')
+        if update_file and update_file.file_id != st.session_state.get('imported_file'):
+            try:
+                with st.spinner("比對中..."):
+                    stats = store.apply_import(read_word_file(update_file))
+                st.session_state.imported_file = update_file.file_id
+                st.session_state.import_result = stats
+                st.rerun()
+            except Exception as e: st.error(f"錯誤: {e}")
+        if st.session_state.get('import_result'):
+            r = st.session_state.import_result
+            st.caption(f"✅ 新增 {r['inserted']}、修改 {r['updated']}、刪除 {r['deleted']}、"
+                       f"調整順序 {r['moved']}、不變 {r['unchanged']}")
             
     if not st.session_state.data_loaded:
         uploaded_file = st.file_uploader("上傳 Word 檔", type=['docx'])
         if uploaded_file:
             try:
                 with st.spinner("讀取中..."):
-                    df_new = parse_word_file(uploaded_file)
-                    df_new.to_csv(DB_FILE, index=False)
-                    st.session_state.df = df_new
+                    store.apply_import(read_word_file(uploaded_file))
                     st.session_state.data_loaded = True
                     st.session_state.current_day = 1
-                    save_current_state()
+                    save_current_state(urgent=True)
                     st.rerun()
             except Exception as e: st.error(f"錯誤: {e}")
 
-    mode_selection = st.radio("前往", ["🌲 森林闖關", "📕 魔法筆記本"], index=0)
-    new_mode = 'normal' if "森林" in mode_selection else 'notebook'
+    # 搜尋結果按下去：切回森林闖關，跳到那一天的那張卡
+    jump = st.session_state.pop('jump_to', None)
+    if jump:
+        day, word_id = jump
+        flush_reviews()
+        st.session_state.mode_radio = "🌲 森林闖關"
+        st.session_state.mode = 'normal'
+        st.session_state.current_day = day
+        st.session_state.word_index = deck.index_of(day, word_id) or 0
+        st.session_state.stage = 1
+        st.session_state.daily_quiz_active = False
+        save_current_state(urgent=True)
+
+    if st.session_state.data_loaded:
+        search_box()
+
+    mode_selection = st.radio("前往", ["🌲 森林闖關", "📕 魔法筆記本", "🔁 到期複習"], index=0, key='mode_radio')
+    new_mode = 'normal' if "森林" in mode_selection else 'notebook' if "筆記本" in mode_selection else 'review'
     if new_mode != st.session_state.mode:
+        flush_reviews()
         st.session_state.mode = new_mode
+        if new_mode == 'review':
+            st.session_state.review_words = next_review_batch()
         st.session_state.word_index = 0
         st.session_state.stage = 1
         st.session_state.daily_quiz_active = False
@@ -355,18 +639,25 @@ with st.sidebar:
         for i in range(1, 31):
             is_done = i in st.session_state.completed_days
             label = f"✅\n{i}" if is_done else f"{i}"
-            has_data = not st.session_state.df.empty and i in st.session_state.df['day'].values
+            has_data = deck.has_day(i)
             btn_type = "primary" if i == st.session_state.current_day else "secondary"
             if cols[(i-1)%4].button(label, key=f"day_{i}", disabled=not has_data, type=btn_type):
+                flush_reviews()
                 st.session_state.current_day = i
                 st.session_state.word_index = 0
                 st.session_state.stage = 1
                 st.session_state.daily_quiz_active = False 
-                save_current_state()
+                save_current_state(urgent=True)
                 st.rerun()
 
+    # 開發者面板：網址加 ?dev=1 才顯示上一次 rerun 的耗時
+    if st.query_params.get("dev") == "1" and st.session_state.last_trace:
+        last = st.session_state.last_trace
+        with st.expander(f"⏱️ 上次執行 {last['total_ms']:.1f} ms ({last['kind']})"):
+            st.text("\n".join(f"{name:<16}{count:>3}x {ms:>9.2f} ms" for name, count, ms in span_totals(last)))
+
 # ==========================================
-# 6. 主程式邏輯
+# 5. 主程式邏輯
 # ==========================================
 if st.session_state.trigger_audio:
     play_audio_html(text=st.session_state.trigger_audio, slow_mode=slow_audio)
@@ -374,33 +665,34 @@ if st.session_state.trigger_audio:
 if st.session_state.trigger_click:
     play_click()
     st.session_state.trigger_click = False
+show_feedback()
 
 if not st.session_state.data_loaded:
     st.info("👈 請先上傳檔案")
     st.stop()
-
-def split_syllables_chunk(word):
-    if " " in word: return word.split(" ")
-    chunks = []
-    temp = word
-    while len(temp) > 0:
-        cut = 3 if len(temp) > 5 else 2
-        if len(temp) <= 3: chunks.append(temp); break
-        chunks.append(temp[:cut])
-        temp = temp[cut:]
-    return chunks
+with span('css'): st.markdown(study_css, unsafe_allow_html=True)
 
 if st.session_state.mode == 'normal':
-    current_words = st.session_state.df[st.session_state.df['day'] == st.session_state.current_day].reset_index(drop=True)
+    with span('words'): current_words = deck.day_words(st.session_state.current_day)
     header_text = f"Day {st.session_state.current_day}"
-else:
+elif st.session_state.mode == 'notebook':
     if len(st.session_state.notebook) == 0:
         st.info("筆記本是空的。")
         st.stop()
-    current_words = st.session_state.df[st.session_state.df['word'].isin(st.session_state.notebook)].reset_index(drop=True)
+    with span('words'): current_words = deck.words_in(st.session_state.notebook)
     header_text = f"📕 筆記本"
+elif st.session_state.mode == 'review':
+    if not st.session_state.review_words:
+        st.session_state.review_words = next_review_batch()
+    if not st.session_state.review_words:
+        nxt = st.session_state.reviews.peek()
+        when = time.strftime('%m/%d %H:%M', time.localtime(nxt[0])) if nxt else ""
+        st.info(f"目前沒有到期的單字。下一個複習時間: {when}" if nxt else "還沒有學過的單字。")
+        st.stop()
+    with span('words'): current_words = deck.words_in(st.session_state.review_words)
+    header_text = f"🔁 複習"
 
-if current_words.empty:
+if not current_words:
     st.warning("無資料")
     st.stop()
 
@@ -424,16 +716,16 @@ if st.session_state.daily_quiz_active:
         for opt in q['options']:
             if st.button(opt, use_container_width=True, key=f"opt_{opt}_{current_q_idx}"):
                 st.session_state.trigger_click = True
+                record_review(q['word'], QUIZ_CORRECT if opt == q['correct'] else QUIZ_WRONG)
                 if opt == q['correct']:
                     st.toast("🎉 答對了！")
                     st.session_state.quiz_score += 1
                 else:
-                    st.error(f"❌ 錯囉！是 {q['word']} ({q['correct']})")
+                    set_feedback('error', f"❌ 錯囉！是 {q['word']} ({q['correct']})")
                     if q['word'] not in st.session_state.notebook:
                         st.session_state.notebook.add(q['word'])
                         st.toast(f"已加入筆記本📕")
                         save_current_state()
-                    time.sleep(1.5)
                 st.session_state.quiz_q_index += 1
                 st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
@@ -448,7 +740,15 @@ if st.session_state.daily_quiz_active:
                 st.session_state.word_index = 0
                 st.session_state.stage = 1
                 st.session_state.daily_quiz_active = False 
-                save_current_state()
+                save_current_state(urgent=True)
+                st.rerun()
+        elif st.session_state.mode == 'review':
+            if st.button("🔁 下一輪複習"):
+                flush_reviews()
+                st.session_state.review_words = next_review_batch()
+                st.session_state.word_index = 0
+                st.session_state.stage = 1
+                st.session_state.daily_quiz_active = False
                 st.rerun()
         else:
             if st.button("🔙 筆記本"):
@@ -462,16 +762,11 @@ if st.session_state.word_index >= len(current_words):
     with st.container():
         st.markdown('<div class="confirm-btn">', unsafe_allow_html=True)
         if st.button("⚔️ 進入聽力驗收 (Quiz)"):
-            questions = []
-            all_meanings = st.session_state.df['meaning'].unique().tolist()
-            for idx, row in current_words.iterrows():
-                target = row['word']
-                correct = row['meaning']
-                distractors = random.sample([m for m in all_meanings if m != correct], 3)
-                options = distractors + [correct]
-                random.shuffle(options)
-                questions.append({"word": target, "correct": correct, "options": options})
-            random.shuffle(questions)
+            # 固定種子：同一位學習者、同一份單字、同一輪的題目可以重現
+            st.session_state.quiz_round += 1
+            rng = random.Random(f"{st.session_state.user_id}:{header_text}:{st.session_state.quiz_round}")
+            with span('quiz'): questions = deck.build_quiz(current_words, rng)
+            prefetch_audio([q['word'] for q in questions], slow_audio)
             st.session_state.quiz_data = questions
             st.session_state.quiz_q_index = 0
             st.session_state.quiz_score = 0
@@ -480,40 +775,25 @@ if st.session_state.word_index >= len(current_words):
         st.markdown('</div>', unsafe_allow_html=True)
     st.stop()
 
-w_data = current_words.iloc[st.session_state.word_index]
-target = str(w_data['word'])
-meaning = str(w_data['meaning'])
-pos = str(w_data.get('pos', ''))
-ipa = str(w_data.get('ipa', ''))
-example = str(w_data.get('example', ''))
-if example == 'nan': example = ""
-if ipa == 'nan': ipa = ""
-
-steps_html = """
-<div style="display:flex;justify-content:center;margin-bottom:20px;">
-    <div style="width:40px;height:40px;border-radius:50%;background:{c1};color:white;display:flex;align-items:center;justify-content:center;font-weight:bold;margin:0 10px;box-shadow:{s1};">學</div>
-    <div style="width:40px;height:40px;border-radius:50%;background:{c2};color:white;display:flex;align-items:center;justify-content:center;font-weight:bold;margin:0 10px;box-shadow:{s2};">拆</div>
-    <div style="width:40px;height:40px;border-radius:50%;background:{c3};color:white;display:flex;align-items:center;justify-content:center;font-weight:bold;margin:0 10px;box-shadow:{s3};">拼</div>
-</div>
-""".format(
-    c1="#4caf50" if st.session_state.stage==1 else "#e0e0e0", s1="0 4px 10px rgba(76,175,80,0.4)" if st.session_state.stage==1 else "none",
-    c2="#4caf50" if st.session_state.stage==2 else "#e0e0e0", s2="0 4px 10px rgba(76,175,80,0.4)" if st.session_state.stage==2 else "none",
-    c3="#4caf50" if st.session_state.stage==3 else "#e0e0e0", s3="0 4px 10px rgba(76,175,80,0.4)" if st.session_state.stage==3 else "none"
-)
+w_data = current_words[st.session_state.word_index]
+target, meaning, pos, ipa, example = w_data.word, w_data.meaning, w_data.pos, w_data.ipa, w_data.example
+
+with span('html'): steps_html = get_steps_html(st.session_state.stage)
 st.markdown(steps_html, unsafe_allow_html=True)
 st.caption(f"Progress: {st.session_state.word_index + 1} / {len(current_words)}")
 
 # Stage 1: 認知
 if st.session_state.stage == 1:
-    play_audio_html(target, slow_mode=slow_audio)
-    colored_word = get_colored_word_html(target)
-    
-    st.markdown(f"""
-    <div class="word-card">
-        {colored_word}
-        <div style="color:#888; margin-top:5px;">{pos} <span style="color:#d81b60; margin-left:10px;">/{ipa}/</span></div>
-    </div>
-    """, unsafe_allow_html=True)
+    # 預載接下來幾張卡；快學完時連驗收要用的字一起預載
+    w_idx = st.session_state.word_index
+    upcoming = [w.word for w in current_words[w_idx + 1:w_idx + 1 + PREFETCH_AHEAD]]
+    if w_idx + PREFETCH_AHEAD >= len(current_words) - 1:
+        upcoming = current_words.words()
+    prefetch_audio(upcoming, slow_audio)
+    prefetch_audio([target], not slow_audio)
+    play_audio_html(target, slow_mode=slow_audio, wait=AUDIO_CARD_WAIT)
+    with span('html'): card_html = get_word_card_html(deck.syllables_of(target), pos, ipa)
+    st.markdown(card_html, unsafe_allow_html=True)
     
     c_play, c_slow = st.columns(2)
     with c_play:
@@ -551,111 +831,27 @@ if st.session_state.stage == 1:
 
     if col2.button("下一步 ➡"):
         st.session_state.trigger_click = True
-        chunks = split_syllables_chunk(target)
+        chunks = deck.syllables_of(target)
         st.session_state.stage2_pool = random.sample(chunks, len(chunks))
         st.session_state.stage2_ans = []
         st.session_state.stage = 2
         st.session_state.show_answer = False
-        save_current_state()
+        save_current_state(urgent=True)
         st.rerun()
 
 # Stage 2: 音節拼圖
 elif st.session_state.stage == 2:
     st.markdown(f"""<div class="word-card"><h2 style="color:#555;">{meaning}</h2></div>""", unsafe_allow_html=True)
-    curr = "".join(st.session_state.stage2_ans)
-    st.markdown(f'<div class="answer-column">{curr}</div>', unsafe_allow_html=True)
-    
     if not st.session_state.stage2_pool and not st.session_state.stage2_ans:
-         chunks = split_syllables_chunk(target)
+         chunks = deck.syllables_of(target)
          st.session_state.stage2_pool = random.sample(chunks, len(chunks))
-
-    cols = st.columns(4) # 強制橫排 4 欄
-    for i, s in enumerate(st.session_state.stage2_pool):
-        if s not in st.session_state.stage2_ans:
-            if cols[i%4].button(s, key=f"s2_{i}"):
-                st.session_state.stage2_ans.append(s)
-                st.session_state.trigger_click = True
-                save_current_state()
-                st.rerun()
-            
-    c1, c2 = st.columns(2)
-    if c1.button("↺"):
-        st.session_state.stage2_ans = []
-        st.session_state.trigger_click = True
-        save_current_state()
-        st.rerun()
-    if c2.button("✅", key="confirm_s2"):
-        if "".join(st.session_state.stage2_ans) == target.replace(" ", ""):
-            st.success("Correct!")
-            chars = list(target.replace(" ", ""))
-            random.shuffle(chars)
-            st.session_state.stage3_pool = chars
-            st.session_state.stage3_ans = []
-            st.session_state.stage = 3
-            save_current_state()
-            st.rerun()
-        else: st.error("錯誤")
+    syllable_puzzle(target)
 
 # Stage 3: 字母拼寫
 elif st.session_state.stage == 3:
     st.markdown(f"""<div class="word-card"><h2 style="color:#555;">{meaning}</h2></div>""", unsafe_allow_html=True)
-    
-    # 視覺化底線
-    spelling_html = get_spelling_slots_html(target, st.session_state.stage3_ans)
-    st.markdown(spelling_html, unsafe_allow_html=True)
-    
-    is_finished = "".join(st.session_state.stage3_ans) == target.replace(" ", "")
-    
     if not st.session_state.stage3_pool and not st.session_state.stage3_ans:
         chars = list(target.replace(" ", ""))
         random.shuffle(chars)
         st.session_state.stage3_pool = chars
-
-    if not is_finished:
-        st.write("👇 點擊字母：")
-        cols = st.columns(4) # 強制橫排 4 欄
-        for i, char in enumerate(st.session_state.stage3_pool):
-            if cols[i%4].button(char, key=f"s3_char_{i}"):
-                st.session_state.stage3_ans.append(char)
-                st.session_state.stage3_pool.pop(i)
-                st.session_state.trigger_click = True
-                save_current_state()
-                st.rerun()
-    else:
-        st.info("拼寫完成！請送出")
-
-    st.markdown("<br>", unsafe_allow_html=True)
-    ctrl_c1, ctrl_c2, ctrl_c3 = st.columns(3)
-    if ctrl_c1.button("⌫"): 
-        if st.session_state.stage3_ans:
-            last_char = st.session_state.stage3_ans.pop()
-            st.session_state.stage3_pool.append(last_char)
-            st.session_state.trigger_click = True
-            save_current_state()
-            st.rerun()
-    if ctrl_c2.button("↺"): 
-        st.session_state.stage3_pool.extend(st.session_state.stage3_ans)
-        st.session_state.stage3_ans = []
-        st.session_state.trigger_click = True
-        save_current_state()
-        st.rerun()
-    
-    with ctrl_c3:
-        st.markdown('<div class="confirm-btn">', unsafe_allow_html=True)
-        if st.button("👑"): 
-            user_word = "".join(st.session_state.stage3_ans)
-            target_clean = target.replace(" ", "")
-            if user_word.lower() == target_clean.lower():
-                st.markdown('<div class="pass-banner" style="background:#66bb6a;color:white;padding:15px;border-radius:15px;text-align:center;font-size:1.8rem;font-weight:bold;">✅ PASS</div>', unsafe_allow_html=True)
-                time.sleep(0.5)
-                st.session_state.word_index += 1
-                st.session_state.stage = 1
-                save_current_state()
-                st.rerun()
-            else:
-                st.error("拼錯囉！")
-                if target not in st.session_state.notebook:
-                    st.session_state.notebook.add(target)
-                    st.toast(f"已加入筆記本📕")
-                    save_current_state()
-        st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+    spelling_puzzle(target)
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+學習進度資料庫 (SQLite, WAL 模式)
+
+取代所有人共用的 user_save.json：每個學習者一列進度，筆記本與已完成天數
+各自一列一筆，存檔時只寫有變動的列，並包在同一個交易裡一次提交。
+WAL 模式讓讀取不會被寫入擋住，數百個學習者同時存檔也不會互相覆蓋。
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+PROGRESS_DB_FILE = 'user_progress.db'
+# 同一位學習者第一次變動後，最多延後幾秒才寫入；期間的連續點擊合併成一次寫入
+WRITE_BEHIND_DELAY = 1.0
+# 進度裡存成 JSON 字串的欄位
+_LIST_FIELDS = ('stage2_pool', 'stage2_ans', 'stage3_pool', 'stage3_ans')
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    user_id     TEXT PRIMARY KEY,
+    current_day INTEGER NOT NULL DEFAULT 1,
+    word_index  INTEGER NOT NULL DEFAULT 0,
+    word_id     INTEGER,
+    stage       INTEGER NOT NULL DEFAULT 1,
+    stage2_pool TEXT NOT NULL DEFAULT '[]',
+    stage2_ans  TEXT NOT NULL DEFAULT '[]',
+    stage3_pool TEXT NOT NULL DEFAULT '[]',
+    stage3_ans  TEXT NOT NULL DEFAULT '[]',
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notebook (
+    user_id TEXT NOT NULL,
+    word    TEXT NOT NULL,
+    PRIMARY KEY (user_id, word)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS completed_days (
+    user_id TEXT NOT NULL,
+    day     INTEGER NOT NULL,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS reviews (
+    user_id  TEXT NOT NULL,
+    word     TEXT NOT NULL,
+    ease     REAL NOT NULL,
+    interval REAL NOT NULL,
+    reps     INTEGER NOT NULL,
+    due      REAL NOT NULL,
+    PRIMARY KEY (user_id, word)
+) WITHOUT ROWID;
+"""
+
+
+class ProgressStore:
+    def __init__(self, path=PROGRESS_DB_FILE):
+        # 各執行緒之後才各自連線，先轉成絕對路徑，不受工作目錄變動影響
+        self.path = os.path.abspath(path)
+        # 每個執行緒一條連線 (Streamlit 每個 session 跑在自己的執行緒)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        # 舊版資料庫沒有 word_id 欄 (目前這張卡的單字 id，題庫重新匯入後靠它找回位置)
+        if 'word_id' not in {r[1] for r in conn.execute("PRAGMA table_info(progress)")}:
+            conn.execute("ALTER TABLE progress ADD COLUMN word_id INTEGER")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None：交易由下面的 BEGIN IMMEDIATE 自己控制
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, user_id):
+        """讀出某位學習者的進度，格式同舊版 user_save.json；沒有紀錄回傳 {}"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT current_day, word_index, word_id, stage, stage2_pool, stage2_ans, stage3_pool, stage3_ans "
+            "FROM progress WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None: return {}
+        state = {"current_day": row[0], "word_index": row[1], "word_id": row[2], "stage": row[3]}
+        for field, value in zip(_LIST_FIELDS, row[4:]):
+            state[field] = json.loads(value)
+        state["notebook"] = [r[0] for r in conn.execute(
+            "SELECT word FROM notebook WHERE user_id = ?", (user_id,))]
+        state["completed_days"] = [r[0] for r in conn.execute(
+            "SELECT day FROM completed_days WHERE user_id = ?", (user_id,))]
+        return state
+
+    def save(self, user_id, state):
+        """
+        寫入進度：進度列 upsert，筆記本與已完成天數只增刪有差異的列。
+        BEGIN IMMEDIATE 先拿寫入鎖，整次存檔是一個原子交易。
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO progress (user_id, current_day, word_index, word_id, stage, "
+                "stage2_pool, stage2_ans, stage3_pool, stage3_ans, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET "
+                "current_day = excluded.current_day, word_index = excluded.word_index, "
+                "word_id = excluded.word_id, stage = excluded.stage, stage2_pool = excluded.stage2_pool, "
+                "stage2_ans = excluded.stage2_ans, stage3_pool = excluded.stage3_pool, "
+                "stage3_ans = excluded.stage3_ans, updated_at = excluded.updated_at",
+                (user_id, state.get("current_day", 1), state.get("word_index", 0), state.get("word_id"),
+                 state.get("stage", 1),
+                 *(json.dumps(state.get(f, []), ensure_ascii=False) for f in _LIST_FIELDS),
+                 time.time()))
+            self._sync_set(conn, 'notebook', 'word', user_id, state.get("notebook", ()))
+            self._sync_set(conn, 'completed_days', 'day', user_id, state.get("completed_days", ()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def load_reviews(self, user_id):
+        """間隔重複紀錄：[(word, ease, interval, reps, due), ...]"""
+        return self._conn().execute(
+            "SELECT word, ease, interval, reps, due FROM reviews WHERE user_id = ?", (user_id,)).fetchall()
+
+    def save_reviews(self, user_id, rows):
+        """只 upsert 有變動的紀錄"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO reviews (user_id, word, ease, interval, reps, due) VALUES (?, ?, ?, ?, ?, ?)",
+                [(user_id, *row) for row in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _sync_set(conn, table, column, user_id, values):
+        wanted = set(values)
+        existing = {r[0] for r in conn.execute(f"SELECT {column} FROM {table} WHERE user_id = ?", (user_id,))}
+        if wanted - existing:
+            conn.executemany(f"INSERT INTO {table} (user_id, {column}) VALUES (?, ?)",
+                             [(user_id, v) for v in wanted - existing])
+        if existing - wanted:
+            conn.executemany(f"DELETE FROM {table} WHERE user_id = ? AND {column} = ?",
+                             [(user_id, v) for v in existing - wanted])
+
+    def clear_all(self):
+        """刪除所有人的進度 (換題庫時用)"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ('progress', 'notebook', 'completed_days', 'reviews'):
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def migrate_legacy_save(self, json_path, user_id):
+        """
+        舊版 user_save.json 只會被搬一次：先改名把檔案「搶」過來，
+        多個 process 同時啟動時只有一個會成功。
+        """
+        claimed = json_path + '.migrated'
+        try:
+            os.replace(json_path, claimed)
+        except FileNotFoundError:
+            return False
+        try:
+            with open(claimed, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.save(user_id, state)
+        return True
+
+
+class ProgressWriter:
+    """
+    延後寫入 (write-behind)：mark_dirty() 只記下最新的進度快照就返回，
+    由背景執行緒在 WRITE_BEHIND_DELAY 秒後寫一次，點擊時不必等磁碟。
+    換關卡/換天時用 urgent=True 立即排入。所有寫入都在同一條背景執行緒，
+    所以寫入順序與呼叫順序一致，不會有舊快照蓋掉新快照。
+    複習紀錄 (mark_review) 也走同一條路，同一個字只寫最後一次的結果。
+    """
+    def __init__(self, store, delay=WRITE_BEHIND_DELAY):
+        self.store = store
+        self.delay = delay
+        self.writes = 0
+        self.coalesced = 0
+        self._pending = {}   # user_id -> [到期時間, 進度快照或 None, {word: 複習紀錄}]
+        self._busy = 0       # 已從 _pending 取出、正在寫入的筆數
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name='progress-writer', daemon=True)
+        self._thread.start()
+        # process 結束 (含 Streamlit server 關閉) 前把還沒寫的進度寫完
+        atexit.register(self.close)
+
+    def _entry(self, user_id):
+        # 呼叫時必須持有 self._cond
+        entry = self._pending.get(user_id)
+        if entry is None:
+            entry = self._pending[user_id] = [time.monotonic() + self.delay, None, {}]
+        else:
+            self.coalesced += 1
+        return entry
+
+    def mark_dirty(self, user_id, state, urgent=False):
+        with self._cond:
+            entry = self._entry(user_id)
+            entry[1] = state
+            if urgent: entry[0] = time.monotonic()
+            self._cond.notify_all()
+
+    def mark_review(self, user_id, row):
+        """row = (word, ease, interval, reps, due)"""
+        with self._cond:
+            self._entry(user_id)[2][row[0]] = row
+            self._cond.notify_all()
+
+    def load(self, user_id):
+        """還沒寫入的快照優先，否則讀資料庫"""
+        with self._cond:
+            entry = self._pending.get(user_id)
+            if entry is not None and entry[1] is not None: return entry[1]
+        return self.store.load(user_id)
+
+    def load_reviews(self, user_id):
+        rows = {row[0]: row for row in self.store.load_reviews(user_id)}
+        with self._cond:
+            entry = self._pending.get(user_id)
+            if entry is not None: rows.update(entry[2])
+        return list(rows.values())
+
+    def _take_ready(self):
+        # 呼叫時必須持有 self._cond
+        while True:
+            now = time.monotonic()
+            ready = [u for u, entry in self._pending.items() if entry[0] <= now or self._stopped]
+            if ready:
+                batch = [(u, self._pending.pop(u)) for u in ready]
+                self._busy += len(batch)
+                return batch
+            if self._stopped: return None
+            timeout = min(entry[0] for entry in self._pending.values()) - now if self._pending else None
+            self._cond.wait(timeout)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                batch = self._take_ready()
+            if batch is None: return
+            for user_id, (_due, state, reviews) in batch:
+                try:
+                    if state is not None: self.store.save(user_id, state)
+                    if reviews: self.store.save_reviews(user_id, list(reviews.values()))
+                    self.writes += 1
+                except Exception:
+                    logger.exception("寫入進度失敗: %s", user_id)
+                    with self._cond:
+                        # 稍後重試；期間若已有更新的快照/紀錄，以新的為準
+                        entry = self._pending.setdefault(user_id, [time.monotonic() + self.delay, None, {}])
+                        if entry[1] is None: entry[1] = state
+                        for word, row in reviews.items(): entry[2].setdefault(word, row)
+            with self._cond:
+                self._busy -= len(batch)
+                self._cond.notify_all()
+
+    def clear_all(self):
+        """丟掉還沒寫入的快照，等進行中的寫入結束後刪除所有人的進度"""
+        with self._cond:
+            self._pending.clear()
+            while self._busy and self._thread.is_alive():
+                self._cond.wait()
+            self.store.clear_all()
+
+    def flush(self, timeout=10.0):
+        """把所有待寫入的快照立刻寫掉，並等到寫完 (或逾時)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            now = time.monotonic()
+            for entry in self._pending.values(): entry[0] = now
+            self._cond.notify_all()
+            while (self._pending or self._busy) and self._thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=10.0)
@@ -0,0 +1,161 @@
+"""
+單字搜尋索引
+
+題庫載入後建一次，之後每次查詢都不必掃過整份題庫：
+- 英文 (單字、例句)：所有小寫單字依字母排序，前綴查詢用二分搜尋找出範圍
+  (等於把前綴樹攤平成排序陣列，查詢一樣是 O(log n + 結果數)，記憶體小很多)。
+  單字欄與例句分成兩份，單字欄的結果排前面，湊滿 limit 個就停。
+  多個字的片語：每個字都當字首，挑候選最少的那個字依題庫順序逐一確認，一樣湊滿就停。
+- 中文：意思開頭相符的先從排序好的意思陣列找 (一樣是二分搜尋)；
+  其餘用字元 n-gram (單字與雙字) -> 位置清單，意思與例句各一份，
+  依題庫順序取所有 n-gram 的交集、再用子字串確認，湊滿 limit 個就停。
+
+    index = SearchIndex(deck.words)
+    index.search('abil')    # -> [Word('ability'), ...]
+    index.search('能力')
+"""
+import heapq
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+SEARCH_LIMIT = 20
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]+')
+
+
+def _grams(run):
+    """'能力' -> {'能', '力', '能力'}：單字與雙字"""
+    return set(run) | {run[i:i + 2] for i in range(len(run) - 1)}
+
+
+def _query_grams(run):
+    # 查詢只需要最長的 n-gram：一個字用單字，兩個字以上用雙字
+    return {run} if len(run) == 1 else {run[i:i + 2] for i in range(len(run) - 1)}
+
+
+class _PrefixArray:
+    """排序好的 (token, 位置)，前綴查詢 = 二分搜尋出一段範圍"""
+    __slots__ = ('keys', 'positions')
+
+    def __init__(self, entries):
+        entries.sort()
+        self.keys = [sys.intern(t) for t, _p in entries]
+        self.positions = array('i', (p for _t, p in entries))
+
+    def range(self, prefix):
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        return lo, hi
+
+    def size(self, prefix):
+        lo, hi = self.range(prefix)
+        return hi - lo
+
+    def ordered(self, prefix, max_runs=8):
+        """範圍內的位置依題庫順序：同一個 token 的位置本來就排好，
+        token 不多就逐段合併 (可以中途停)，前綴涵蓋太多 token 就直接整段排序"""
+        lo, hi = self.range(prefix)
+        runs, start = [], lo
+        while start < hi and len(runs) < max_runs:
+            end = bisect_right(self.keys, self.keys[start], start, hi)
+            runs.append(self.positions[start:end])
+            start = end
+        if start < hi: return sorted(self.positions[lo:hi])
+        return runs[0] if len(runs) == 1 else heapq.merge(*runs)
+
+
+class SearchIndex:
+    def __init__(self, words):
+        self.words = words  # Deck.words：依 (day, 匯入順序) 排好的 Word
+        word_entries, example_entries, meaning_entries = [], [], []
+        meaning_grams, example_grams = {}, {}
+        for i, w in enumerate(words):
+            own = set(_TOKEN_RE.findall(w.word.lower()))
+            word_entries += [(t, i) for t in own]
+            example_entries += [(t, i) for t in set(_TOKEN_RE.findall(w.example.lower())) - own]
+            if w.meaning: meaning_entries.append((' '.join(w.meaning.lower().split()), i))
+            for text, grams in ((w.meaning, meaning_grams), (w.example, example_grams)):
+                for run in _CJK_RE.findall(text):
+                    for g in _grams(run):
+                        postings = grams.setdefault(g, [])
+                        if not postings or postings[-1] != i: postings.append(i)
+        self._word = _PrefixArray(word_entries)
+        self._example = _PrefixArray(example_entries)
+        self._meaning = _PrefixArray(meaning_entries)
+        self._meaning_grams = {g: array('i', p) for g, p in meaning_grams.items()}
+        self._example_grams = {g: array('i', p) for g, p in example_grams.items()}
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """依相關程度排好的 Word，最多 limit 個"""
+        query = ' '.join(query.lower().split())
+        if not query: return []
+        if _CJK_RE.search(query): return self._search_cjk(query, limit)
+        tokens = _TOKEN_RE.findall(query)
+        if not tokens: return []
+        if len(tokens) == 1: return self._search_prefix(tokens[0], limit)
+        return self._search_phrase(query, tokens, limit)
+
+    def _search_prefix(self, prefix, limit):
+        # 單字欄依字母順序 (完全相同的字最先)，不夠再補例句裡出現的
+        found, seen = [], set()
+        for table in (self._word, self._example):
+            lo, hi = table.range(prefix)
+            for p in table.positions[lo:hi]:
+                if p in seen: continue
+                seen.add(p)
+                found.append(self.words[p])
+                if len(found) >= limit: return found
+        return found
+
+    def _search_phrase(self, query, tokens, limit):
+        # 多個英文字當成片語：每個字都要是字首 (跟單一個字的查詢一樣)，
+        # 用候選最少的字，依題庫順序合併它的各段位置，確認整段有出現，湊滿 limit 個就停
+        rarest = min(tokens, key=lambda t: self._word.size(t) + self._example.size(t))
+        phrase = re.compile(r'(?<![a-z0-9])' + re.escape(query))
+        found, seen = [], set()
+        # 單字欄相符的排前面；例句裡的字可能已經算在單字欄 (例句表只收單字本身沒有的字)
+        for field, tables in (('word', (self._word,)), ('example', (self._word, self._example))):
+            sources = [s for s in (table.ordered(rarest) for table in tables) if s]
+            for p in sources[0] if len(sources) == 1 else heapq.merge(*sources):
+                if p in seen: continue
+                text = getattr(self.words[p], field).lower()
+                if query not in text or not phrase.search(text): continue
+                seen.add(p)
+                found.append(self.words[p])
+                if len(found) >= limit: return found
+        return found
+
+    def _search_cjk(self, query, limit):
+        runs = _CJK_RE.findall(query)
+        found, seen = [], set()
+        # 意思開頭相符 (完全相同的排最前)，其次意思裡有，最後只有例句裡有
+        lo, hi = self._meaning.range(query)
+        candidates = [self._meaning.positions[lo:hi],
+                      _intersect(self._meaning_grams, runs), _intersect(self._example_grams, runs)]
+        for field, positions in zip(('meaning', 'meaning', 'example'), candidates):
+            for p in positions:
+                if p in seen: continue
+                w = self.words[p]
+                text = w.meaning if field == 'meaning' else w.meaning + ' ' + w.example
+                if not all(run in text for run in runs): continue  # n-gram 都有，但不是連在一起
+                seen.add(p)
+                found.append(w)
+                if len(found) >= limit: return found
+        return found
+
+
+def _intersect(grams, runs):
+    """所有查詢 n-gram 都出現的位置，依題庫順序逐一產出 (不必先算完整個交集)"""
+    lists = [grams.get(g) for run in runs for g in _query_grams(run)]
+    if not all(lists): return
+    lists.sort(key=len)
+    first, rest = lists[0], lists[1:]
+    for p in first:
+        if all(_contains(other, p) for other in rest): yield p
+
+
+def _contains(postings, p):
+    i = bisect_left(postings, p)
+    return i < len(postings) and postings[i] == p
@@ -0,0 +1,109 @@
+"""
+間隔重複複習排程 (SM-2)
+
+每個學習過的單字有一筆複習紀錄 (熟悉度 ease、間隔 interval、連續答對次數 reps、
+下次到期時間 due)。同一輪學習裡的 Stage 3 拼寫與測驗結果合併成一次評分 (取較差的)，
+到期的字放在 heap 裡，取「下一個到期的字」是 O(log n)。
+"""
+import heapq
+import time
+
+DAY_SECONDS = 86400.0
+LAPSE_DELAY = 10 * 60.0  # 答錯的字 10 分鐘後再複習
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+# 作答結果對應的 SM-2 分數 (0-5，3 以上算記得)
+QUIZ_CORRECT = 4
+QUIZ_WRONG = 1
+SPELL_PASS = 4
+SPELL_FAIL = 2
+
+
+class ReviewRecord:
+    __slots__ = ('word', 'ease', 'interval', 'reps', 'due')
+
+    def __init__(self, word, ease=DEFAULT_EASE, interval=0.0, reps=0, due=0.0):
+        self.word = word
+        self.ease = ease
+        self.interval = interval  # 天
+        self.reps = reps
+        self.due = due            # time.time() 秒數
+
+    def as_row(self):
+        return (self.word, self.ease, self.interval, self.reps, self.due)
+
+    def grade(self, quality, now=None):
+        """SM-2：依作答分數更新間隔與熟悉度"""
+        now = time.time() if now is None else now
+        if quality < 3:
+            self.reps = 0
+            self.interval = 0.0
+            self.due = now + LAPSE_DELAY
+        else:
+            self.reps += 1
+            if self.reps == 1: self.interval = 1.0
+            elif self.reps == 2: self.interval = 6.0
+            else: self.interval = round(self.interval * self.ease, 1)
+            self.due = now + self.interval * DAY_SECONDS
+        self.ease = max(MIN_EASE, self.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+
+class ReviewQueue:
+    """
+    單一學習者的到期佇列。紀錄更新時直接推入新的 (due, word)，
+    舊的項目留在 heap 裡，取出時發現 due 對不上就丟掉 (lazy deletion)。
+    """
+    def __init__(self, rows=()):
+        self.records = {row[0]: ReviewRecord(*row) for row in rows}
+        self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(r.due, r.word) for r in self.records.values()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self.records)
+
+    def grade(self, word, quality, now=None):
+        rec = self.records.get(word)
+        if rec is None:
+            rec = self.records[word] = ReviewRecord(word)
+        rec.grade(quality, now)
+        heapq.heappush(self._heap, (rec.due, word))
+        # 過期項目太多時重建，heap 大小維持在紀錄數的兩倍內
+        if len(self._heap) > 2 * len(self.records) + 16: self._rebuild()
+        return rec
+
+    def prune(self, known):
+        """丟掉不在 known 裡的字 (題庫已經刪掉的字) 的紀錄；回傳丟掉幾個"""
+        stale = [word for word in self.records if word not in known]
+        for word in stale: del self.records[word]
+        if stale: self._rebuild()
+        return len(stale)
+
+    def _is_live(self, entry):
+        rec = self.records.get(entry[1])
+        return rec is not None and rec.due == entry[0]
+
+    def peek(self):
+        """下一個到期的 (due, word)；沒有紀錄回傳 None"""
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    def due_words(self, now=None, limit=20):
+        """目前已到期的字 (最早到期的在前)，最多 limit 個；O(limit log n)"""
+        now = time.time() if now is None else now
+        words, popped = [], []
+        while self._heap and len(words) < limit:
+            entry = self._heap[0]
+            if not self._is_live(entry):
+                heapq.heappop(self._heap)
+                continue
+            if entry[0] > now: break
+            popped.append(heapq.heappop(self._heap))
+            words.append(entry[1])
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return words
@@ -0,0 +1,56 @@
+"""
+音節拆解
+
+匯入題庫時就把每個單字拆好、跟著題庫存進資料庫 (vocab_store)，
+畫面上色與 Stage 2 音節拼圖直接讀存好的結果，rerun 時不再重算。
+同一個字在不同題庫只拆一次 (有上限的 LRU 快取)。
+pyphen 的字典第一次拆字時才載入，只讀存好音節的畫面不必付這個啟動成本。
+"""
+import json
+from functools import lru_cache
+
+SYLLABLE_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=1)
+def hyphenator():
+    """英文斷字字典 (第一次呼叫時載入)；沒安裝 pyphen 回傳 None"""
+    try:
+        import pyphen
+    except ImportError:
+        return None
+    return pyphen.Pyphen(lang='en')
+
+
+def _fixed_chunks(word):
+    # 沒有 pyphen 時的退路：每 2-3 個字母切一段
+    chunks = []
+    temp = word
+    while len(temp) > 0:
+        cut = 3 if len(temp) > 5 else 2
+        if len(temp) <= 3: chunks.append(temp); break
+        chunks.append(temp[:cut])
+        temp = temp[cut:]
+    return chunks
+
+
+@lru_cache(maxsize=SYLLABLE_CACHE_SIZE)
+def split_syllables(word):
+    """
+    'ability' -> ('abil', 'ity')；片語依空白拆成單字。
+    只在原字上切位置、不刪任何字元，所以各段接起來一定等於原字 (去掉空白)
+    """
+    if " " in word: return tuple(word.split())
+    dic = hyphenator()
+    if dic is None: return tuple(_fixed_chunks(word))
+    cuts = [0, *dic.positions(word), len(word)]
+    return tuple(word[a:b] for a, b in zip(cuts, cuts[1:]) if a < b)
+
+
+def encode_syllables(word):
+    """存進資料庫的格式 (JSON 陣列)"""
+    return json.dumps(split_syllables(word), ensure_ascii=False)
+
+
+def decode_syllables(text):
+    return tuple(json.loads(text)) if text else ()
@@ -0,0 +1,137 @@
+"""
+每次 rerun 的耗時紀錄 (span)
+
+學習者說「卡卡的」時，要知道一次 rerun 的時間花在哪：載入題庫、選當天的字、
+發音、組 HTML、存檔……每一段包成一個具名 span，用單調時鐘 (perf_counter_ns) 計時。
+
+    trace = begin_trace(st.session_state.get('trace'), session_id)
+    with span('deck'): ...
+    @traced('save')
+    def save_current_state(): ...
+
+Streamlit 的 script 可能在任何地方被 st.stop() / st.rerun() 中斷，沒有「執行完」的時機，
+所以一次 rerun 的紀錄在「下一次 rerun 開始時」才結束並寫出。
+每次 rerun 寫一行 JSON 到 pet_trace.jsonl (滿了自動輪替)。
+一個 span 只是兩次讀時鐘加一次 append，正式環境可以一直開著；PET_TRACE=0 可關閉。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+TRACE_FILE = os.environ.get('PET_TRACE_FILE', 'pet_trace.jsonl')
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 3
+ENABLED = os.environ.get('PET_TRACE', '1') != '0'
+
+_local = threading.local()   # 目前這個 script 執行緒的 Trace
+_log_lock = threading.Lock()
+_span_log = None
+
+
+class Trace:
+    __slots__ = ('session', 'kind', 'seq', 'started', 't0', 'spans', 'tags')
+
+    def __init__(self, session, kind='rerun', seq=0):
+        self.session = session
+        self.kind = kind         # 'rerun' 整頁 / 'fragment' 只重跑某個 fragment
+        self.seq = seq           # 這個 session 的第幾次執行
+        self.started = time.time()
+        self.t0 = time.perf_counter_ns()
+        self.spans = []          # [(name, 開始 ns, 耗時 ns), ...]
+        self.tags = {}
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.spans.append((name, start - self.t0, end - start))
+
+    def summary(self):
+        """寫進 JSONL 的格式；時間單位毫秒"""
+        total = max((s + d for _name, s, d in self.spans), default=0)
+        return {
+            "ts": round(self.started, 3),
+            "session": self.session,
+            "kind": self.kind,
+            "seq": self.seq,
+            "total_ms": round(total / 1e6, 3),
+            "spans": [[name, round(s / 1e6, 3), round(d / 1e6, 3)] for name, s, d in self.spans],
+            **self.tags,
+        }
+
+
+def _get_span_log():
+    global _span_log
+    with _log_lock:
+        if _span_log is None:
+            _span_log = logging.getLogger('pet.trace')
+            _span_log.propagate = False
+            _span_log.setLevel(logging.INFO)
+            try:
+                handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_MAX_BYTES,
+                                              backupCount=TRACE_BACKUPS, encoding='utf-8')
+            except OSError:
+                handler = logging.NullHandler()  # 唯讀環境：只保留畫面上的開發者面板
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            _span_log.addHandler(handler)
+        return _span_log
+
+
+def finish_trace(trace):
+    """結束一次執行：寫一行 JSON，回傳摘要 (給開發者面板)"""
+    if trace is None: return None
+    summary = trace.summary()
+    if ENABLED and trace.spans:
+        _get_span_log().info(json.dumps(summary, ensure_ascii=False))
+    return summary
+
+
+def begin_trace(previous, session, kind='rerun'):
+    """
+    開始新的一次執行，並把上一次 (previous) 收尾寫出。
+    回傳 (新的 Trace, 上一次的摘要)
+    """
+    last = finish_trace(previous)
+    trace = Trace(session, kind, previous.seq + 1 if previous else 0)
+    _local.trace = trace if ENABLED else None
+    return trace, last
+
+
+@contextmanager
+def span(name):
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
+
+
+def traced(name):
+    """把整個函式包成一個 span"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = getattr(_local, 'trace', None)
+            if trace is None: return fn(*args, **kwargs)
+            with trace.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def span_totals(summary):
+    """同名 span 加總：[(name, 次數, 總毫秒), ...]，依總毫秒由大到小"""
+    totals = {}
+    for name, _start, duration in summary["spans"]:
+        count, ms = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, ms + duration)
+    return sorted(((n, c, round(ms, 3)) for n, (c, ms) in totals.items()), key=lambda t: -t[2])
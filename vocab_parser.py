@@ -0,0 +1,185 @@
+"""
+單字表解析引擎 (pet_app.py 上傳與 convert.py 共用)
+
+輸入 docx_stream.iter_table_rows 產出的 (table_index, cells)，輸出統一格式：
+    {"day", "word", "pos", "ipa", "meaning", "example"}
+
+- 每個表格第一列是表頭，依表頭文字決定欄位 (ColumnSchema)；表頭列的每一格都要是
+  欄名 (可加標點)，否則當成資料列。認不出表頭的表格改用逐格判斷內容 (HeuristicSchema)，
+  也可以自行指定 schema。
+- 每個有資料的表格算一天 (最多 MAX_DAY 天)；表格裡單獨一格寫
+  "Day N" 或 "第 N 天" 的列會直接把天數設為 N。
+- 所有正規表示式預先編譯；同樣文字的格子只判斷一次 (lru_cache)。
+"""
+import re
+from functools import lru_cache
+
+MAX_DAY = 28
+CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+LATIN_RE = re.compile(r'[a-zA-Z]')
+PARENS_RE = re.compile(r'\(.*?\)')
+LEADING_NUM_RE = re.compile(r'^[\d\.]+\s*')
+WORD_POS_RE = re.compile(r"([a-zA-Z\s\-\/']+)[\s]*(\(.*\))?")
+DAY_MARKER_RE = re.compile(r'^(?:Day\s*(\d+)|第\s*(\d+)\s*天)', re.IGNORECASE)
+LABEL_NOTE_RE = re.compile(r'[(（][^)）]*[)）]')
+LABEL_SPLIT_RE = re.compile(r'[\s/|、]+')
+LABEL_PUNCT = '.:：#*()（）[]【】-_'
+HEADER_WORDS = frozenset(['word', 'vocabulary', '單字'])
+
+# 格子內容種類
+MEANING, IPA, SENTENCE, WORD = 'meaning', 'ipa', 'sentence', 'word'
+FIELDS = ('word', 'ipa', 'meaning', 'example')
+
+
+@lru_cache(maxsize=65536)
+def classify_cell(text):
+    """
+    判斷一格的內容：中文 -> 意思、含 / 或 [ 的短字串 -> 音標、
+    四個字以上 -> 例句、其他含英文字母 -> 單字；都不是回傳 None
+    """
+    if not text: return None
+    if CJK_RE.search(text):
+        # 太長的中文多半是例句翻譯
+        return MEANING if len(text) < 50 else None
+    if ('/' in text or '[' in text) and len(text) < 30: return IPA
+    # 編號與括號詞性不算字數：'1. look (n & v)' 還是單字
+    if len(clean_word_text(text).split()) > 3: return SENTENCE
+    if LATIN_RE.search(text): return WORD
+    return None
+
+
+def clean_word_text(text):
+    """去掉括號內的詞性與開頭的編號：'1. ability (n)' -> 'ability'"""
+    return LEADING_NUM_RE.sub('', PARENS_RE.sub('', text)).strip()
+
+
+@lru_cache(maxsize=65536)
+def split_word_pos(raw):
+    """'ability (n)' -> ('ability', '(n)')"""
+    raw = LEADING_NUM_RE.sub('', raw)
+    match = WORD_POS_RE.match(raw)
+    if not match: return raw, ""
+    return match.group(1).strip(), (match.group(2) or "").strip()
+
+
+def day_marker(cells):
+    """整列只有 'Day 3' / '第 3 天' -> 3，否則 None (橫跨整列的合併儲存格每格都是同一段文字)"""
+    filled = {c.strip() for c in cells if c.strip()}
+    if len(filled) != 1: return None
+    match = DAY_MARKER_RE.match(filled.pop())
+    if not match: return None
+    return int(match.group(1) or match.group(2))
+
+
+class ColumnSchema:
+    """固定欄位位置：field -> 欄位索引 (預設：排序|單字|音標|中文意思|例句)"""
+    # 表頭欄名 -> 欄位 ('' 是認得但不用的欄，例如編號)
+    LABELS = (
+        ('word', ('單字', '英文', 'word', 'words', 'vocabulary', 'english')),
+        ('ipa', ('音標', 'ipa', 'kk', 'phonetic', 'phonetics', 'pronunciation')),
+        ('meaning', ('意思', '中文', '中文意思', '中譯', 'meaning', 'chinese', 'definition')),
+        ('example', ('例句', 'example', 'examples', 'sentence', 'sentences')),
+        ('', ('排序', '編號', '序號', '詞性', 'no', 'number', 'pos', 'day')),
+    )
+    FIELD_OF_LABEL = {label: field for field, labels in LABELS for label in labels}
+
+    def __init__(self, word=1, ipa=2, meaning=3, example=4, min_cells=4):
+        self.columns = dict(word=word, ipa=ipa, meaning=meaning, example=example)
+        self.min_cells = min_cells
+
+    @classmethod
+    def label_field(cls, cell):
+        """
+        表頭格 -> 欄位：'單字'、'Word:'、'單字 / Word'、'單字 (詞性)' 都算 word，
+        中文欄名前面可以加修飾 ('實用例句')；只有標點 (例如 '#') 或認得但不用的欄回傳 ''，
+        不是欄名回傳 None
+        """
+        text = LABEL_NOTE_RE.sub(' ', cell).strip().lower()
+        parts = [p.strip(LABEL_PUNCT) for p in LABEL_SPLIT_RE.split(text)]
+        fields = {cls._part_field(p) for p in parts if p}
+        if not fields: return ''
+        if len(fields) != 1 or None in fields: return None
+        return fields.pop()
+
+    @classmethod
+    def _part_field(cls, part):
+        field = cls.FIELD_OF_LABEL.get(part)
+        if field is None and CJK_RE.match(part):
+            field = next((f for label, f in cls.FIELD_OF_LABEL.items()
+                          if CJK_RE.match(label) and part.endswith(label)), None)
+        return field
+
+    @classmethod
+    def from_header(cls, cells):
+        """
+        依表頭文字找欄位。每一格都要是欄名 (password、'Spell the word…' 這類資料格不算)，
+        而且至少認得「單字」加上另一個欄位，否則回傳 None
+        """
+        columns = {}
+        for idx, cell in enumerate(cells):
+            if not cell.strip(): continue
+            field = cls.label_field(cell)
+            if field is None: return None
+            if field and field not in columns: columns[field] = idx
+        if 'word' not in columns or len(columns) < 2: return None
+        return cls(min_cells=min(4, max(columns.values()) + 1), **{f: columns.get(f) for f in FIELDS})
+
+    def map_row(self, cells):
+        if len(cells) < self.min_cells: return None
+        n = len(cells)
+        return {f: (cells[i].strip() if i is not None and i < n else '') for f, i in self.columns.items()}
+
+
+class HeuristicSchema:
+    """不看欄位位置，逐格判斷內容；每種內容取第一個出現的格子"""
+    KINDS = {WORD: 'word', IPA: 'ipa', MEANING: 'meaning', SENTENCE: 'example'}
+
+    def map_row(self, cells):
+        # 沒有表頭可跳過：整列都是欄名 (例如 "No. | English") 的標題列要在這裡排除
+        if all(ColumnSchema.label_field(c) is not None for c in cells if c.strip()): return None
+        row = dict.fromkeys(FIELDS, '')
+        for cell in cells:
+            cell = cell.strip()
+            field = self.KINDS.get(classify_cell(cell))
+            if field and not row[field]:
+                # 單字格只去掉編號，詞性留給 split_word_pos
+                row[field] = LEADING_NUM_RE.sub('', cell) if field == 'word' else cell
+        if clean_word_text(row['word']).lower() in HEADER_WORDS: return None
+        return row
+
+
+def parse_rows(rows, schema=None):
+    """
+    rows: (table_index, cells) 的序列。schema 為 None 時每個表格依表頭自動決定。
+    產出 {"day", "word", "pos", "ipa", "meaning", "example"}
+    """
+    day = 0
+    last_table = None
+    table_schema = None
+    table_has_data = False
+    for table_index, cells in rows:
+        if table_index != last_table:
+            last_table, table_has_data = table_index, False
+            table_schema = schema
+            if table_schema is None:
+                table_schema = ColumnSchema.from_header(cells)
+                if table_schema is not None: continue  # 表頭列
+                table_schema = HeuristicSchema()
+
+        marker = day_marker(cells)
+        if marker is not None:
+            day, table_has_data = marker, True  # 之後的列直接算這一天
+            continue
+
+        row = table_schema.map_row(cells)
+        if row is None or not row['word']: continue
+        word, pos = split_word_pos(row['word'])
+        if not word: continue
+
+        if not table_has_data:
+            day = min(day + 1, MAX_DAY)
+            table_has_data = True
+        yield {
+            "day": day, "word": word, "pos": pos, "ipa": row['ipa'].replace("/", ""),
+            "meaning": row['meaning'], "example": row['example'],
+        }
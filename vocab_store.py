@@ -0,0 +1,225 @@
+"""
+單字資料庫 (SQLite)
+
+取代原本的 pet_database.csv：匯入、比對都在資料庫裡做，
+畫面用的唯讀題庫 (deck.Deck) 每個 process 只從這裡讀一次。
+音節在匯入時就拆好 (syllables 欄，JSON 陣列)，畫面直接讀。
+
+重新上傳同一份單字表時用 apply_import()：每列算一個內容雜湊，跟資料庫比對後
+只新增/修改/刪除有差異的列。同一個字的 id 不變 (學習進度靠 id 記位置)，
+順序記在 seq 欄，不靠 id 排序。
+"""
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+
+from syllables import encode_syllables
+
+VOCAB_DB_FILE = 'pet_database.db'
+VOCAB_COLUMNS = ('day', 'word', 'pos', 'ipa', 'meaning', 'example')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS words (
+    id      INTEGER PRIMARY KEY,
+    day     INTEGER NOT NULL,
+    word    TEXT NOT NULL,
+    pos     TEXT NOT NULL DEFAULT '',
+    ipa     TEXT NOT NULL DEFAULT '',
+    meaning TEXT NOT NULL DEFAULT '',
+    example TEXT NOT NULL DEFAULT '',
+    syllables TEXT NOT NULL DEFAULT '',
+    seq     INTEGER NOT NULL DEFAULT 0,
+    row_hash TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_words_word ON words(word);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+# 舊版資料庫沒有 seq 欄，索引要等補上欄位後才建
+_SEQ_INDEX = "CREATE INDEX IF NOT EXISTS idx_words_day_seq ON words(day, seq)"
+_SELECT = "SELECT id, " + ", ".join(VOCAB_COLUMNS) + " FROM words"
+
+
+def _digest(rows):
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _row_hash(row):
+    return hashlib.sha1(json.dumps(row, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def _clean(value):
+    # CSV 缺欄位的 None 一律存成空字串
+    if value is None: return ''
+    return str(value).strip()
+
+
+def _clean_rows(records):
+    return [(int(r['day']),) + tuple(_clean(r.get(c)) for c in VOCAB_COLUMNS[1:]) for r in records]
+
+
+_INSERT_WITH_ID = (f"INSERT INTO words (id, {', '.join(VOCAB_COLUMNS)}, syllables, seq, row_hash) "
+                   f"VALUES ({', '.join('?' * (len(VOCAB_COLUMNS) + 4))})")
+
+
+class VocabStore:
+    def __init__(self, path=VOCAB_DB_FILE):
+        self.path = path
+        # Streamlit 每個 session 在不同執行緒跑 script，共用連線時用鎖保護
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            # 舊版資料庫沒有 syllables / seq / row_hash 欄
+            columns = {r[1] for r in self._conn.execute("PRAGMA table_info(words)")}
+            if 'syllables' not in columns:
+                self._conn.execute("ALTER TABLE words ADD COLUMN syllables TEXT NOT NULL DEFAULT ''")
+            if 'seq' not in columns:
+                self._conn.execute("ALTER TABLE words ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+                self._conn.execute("UPDATE words SET seq = id")
+            if 'row_hash' not in columns:
+                self._conn.execute("ALTER TABLE words ADD COLUMN row_hash TEXT NOT NULL DEFAULT ''")
+                cols = ", ".join(VOCAB_COLUMNS)
+                self._conn.executemany("UPDATE words SET row_hash = ? WHERE id = ?", [
+                    (_row_hash(list(r[1:])), r[0]) for r in self._conn.execute(f"SELECT id, {cols} FROM words")])
+            self._conn.execute(_SEQ_INDEX)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def is_empty(self):
+        return not self._query("SELECT 1 FROM words LIMIT 1")
+
+    def content_hash(self):
+        """目前題庫內容的雜湊 (匯入時算好存在 meta)，題庫有變就會不同"""
+        rows = self._query("SELECT value FROM meta WHERE key = 'content_hash'")
+        return rows[0][0] if rows else ''
+
+    def word_rows(self):
+        """整份題庫：(id, day, word, pos, ipa, meaning, example)，依 day、匯入順序排序"""
+        return self._query(_SELECT + " ORDER BY day, seq")
+
+    def syllable_rows(self):
+        """(word, 音節 JSON)，每個字一列"""
+        return self._query("SELECT word, MIN(syllables) FROM words GROUP BY word")
+
+    def replace_all(self, records):
+        """整份題庫換掉 (上傳新檔案時用)，單一交易完成"""
+        rows = _clean_rows(records)
+        digest = _digest(rows)
+        # 匯入時順便拆音節 (row[1] 是 word)
+        rows = [row + (encode_syllables(row[1]), seq, _row_hash(row)) for seq, row in enumerate(rows)]
+        with self._lock, self._conn:
+            # 整份換掉也不重用舊的 id (存檔裡記的 word_id 不會指到別的字)
+            next_id = self._next_id()
+            self._conn.execute("DELETE FROM words")
+            self._insert_from(next_id, rows)
+            self._set_meta('content_hash', digest)
+        return len(rows)
+
+    def apply_import(self, records):
+        """
+        重新匯入：跟目前的題庫逐列比對，只寫有差異的列，單一交易完成。
+        同一個字 (第 n 次出現對第 n 次出現，內容相同的優先配對) 保留原本的 id；
+        沒變的列不動，內容變了才更新，只有新的字需要拆音節。
+        回傳 {"inserted", "updated", "deleted", "moved", "unchanged"} 各幾列
+        """
+        rows = _clean_rows(records)
+        digest = _digest(rows)
+        stats = dict(inserted=0, updated=0, deleted=0, moved=0, unchanged=0)
+        if digest == self.content_hash():
+            stats["unchanged"] = len(rows)
+            return stats
+
+        # word -> [(id, seq, row_hash), ...]，依原本的順序
+        existing = defaultdict(list)
+        for row_id, word, seq, row_hash in self._query("SELECT id, word, seq, row_hash FROM words ORDER BY seq"):
+            existing[word].append((row_id, seq, row_hash))
+
+        inserts, updates, moves = [], [], []
+        for seq, row in enumerate(rows):
+            row_hash = _row_hash(row)
+            candidates = existing.get(row[1])
+            if not candidates:
+                inserts.append(row + (encode_syllables(row[1]), seq, row_hash))
+                continue
+            match = next((c for c in candidates if c[2] == row_hash), candidates[0])
+            candidates.remove(match)
+            row_id, old_seq, old_hash = match
+            if old_hash != row_hash:
+                updates.append(row + (seq, row_hash, row_id))
+            elif old_seq != seq:
+                moves.append((seq, row_id))
+            else:
+                stats["unchanged"] += 1
+        deletes = [(c[0],) for candidates in existing.values() for c in candidates]
+
+        with self._lock, self._conn:
+            # 先算好新的 id 再刪：刪掉的字的 id 不會被別的字拿去
+            next_id = self._next_id()
+            if deletes: self._conn.executemany("DELETE FROM words WHERE id = ?", deletes)
+            if updates:
+                assigns = ", ".join(f"{c} = ?" for c in VOCAB_COLUMNS)
+                self._conn.executemany(f"UPDATE words SET {assigns}, seq = ?, row_hash = ? WHERE id = ?", updates)
+            if moves: self._conn.executemany("UPDATE words SET seq = ? WHERE id = ?", moves)
+            self._insert_from(next_id, inserts)
+            self._set_meta('content_hash', digest)
+        stats.update(inserted=len(inserts), updated=len(updates), deleted=len(deletes), moved=len(moves))
+        return stats
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM words")
+            self._set_meta('content_hash', '')
+
+    def rehash(self):
+        """重新計算內容雜湊 (舊版資料庫沒有存 meta 時用)"""
+        cols = ", ".join(VOCAB_COLUMNS)
+        with self._lock, self._conn:
+            rows = [list(r) for r in self._conn.execute(f"SELECT {cols} FROM words ORDER BY seq")]
+            self._set_meta('content_hash', _digest(rows))
+
+    def fill_syllables(self):
+        """補上還沒拆音節的字 (舊版資料庫升級時用)；回傳補了幾個字"""
+        words = [r[0] for r in self._query("SELECT DISTINCT word FROM words WHERE syllables = ''")]
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE words SET syllables = ? WHERE word = ?",
+                                   [(encode_syllables(w), w) for w in words])
+        return len(words)
+
+    def _next_id(self):
+        """用過的最大 id + 1 (目前的列與 meta 記的 max_id 取大的，舊版資料庫沒有 max_id 也算得對)"""
+        rows_max = self._conn.execute("SELECT MAX(id) FROM words").fetchone()[0] or 0
+        meta_max = self._conn.execute("SELECT value FROM meta WHERE key = 'max_id'").fetchone()
+        return max(rows_max, int(meta_max[0]) if meta_max else 0) + 1
+
+    def _insert_from(self, next_id, rows):
+        """從 next_id 開始依序給 id 寫入，並記下用過的最大 id (clear 之後也保留)"""
+        self._conn.executemany(_INSERT_WITH_ID, [(next_id + i,) + row for i, row in enumerate(rows)])
+        self._set_meta('max_id', str(next_id + len(rows) - 1))
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def import_csv(self, csv_path):
+        """匯入舊版的 pet_database.csv"""
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            return self.replace_all(csv.DictReader(f))
+
+
+def open_vocab_store(path=VOCAB_DB_FILE, legacy_csv=None):
+    """開啟資料庫；若資料庫是空的但有舊版 CSV，就先搬過來"""
+    store = VocabStore(path)
+    if legacy_csv and store.is_empty() and os.path.exists(legacy_csv):
+        store.import_csv(legacy_csv)
+    elif not store.is_empty() and not store.content_hash():
+        store.rehash()
+    store.fill_syllables()
+    return store